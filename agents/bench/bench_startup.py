@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""Startup and import-time budget check for the Python scripts of the agent skills.
+
+Every script under `agents/skills/*/scripts/` is started from scratch on each
+agent tool call, so its interpreter-plus-import cost is paid every time. This
+launches each one's CLI (`--help`, plus real entries against local fixtures and
+the TTS mock server) many times and reports wall time, the extra time over a
+bare interpreter, peak RSS and the slowest top-level imports (`-X importtime`).
+It exits 1 when a case goes over its budget in startup_budgets.json:
+
+    bench_startup.py [-n 20] [--only tts_query] [--json report.json]
+"""
+
+import argparse
+import json
+import os
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SKILLS_DIR = os.path.join(BENCH_DIR, "..", "skills")
+TTS_SCRIPTS = os.path.join(SKILLS_DIR, "tts", "scripts")
+PI_SCRIPTS = os.path.join(SKILLS_DIR, "pi-headless", "scripts")
+sys.path.insert(0, os.path.join(SKILLS_DIR, "tts", "bench"))
+
+import mock_openspeech  # noqa: E402
+
+_MAIN_GUARD = re.compile(r"""^if __name__ == ["']__main__["']:""", re.MULTILINE)
+_IMPORTTIME = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)")
+# ru_maxrss is in KiB on Linux and in bytes on macOS.
+RSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+
+def help_cases() -> list[dict]:
+    """`<script> --help` for every skill script: the floor of what one call costs.
+
+    Library modules (no `__main__` guard) are left out; they have no command line
+    and are measured as part of the scripts that import them.
+    """
+    cases = []
+    for skill in sorted(os.listdir(SKILLS_DIR)):
+        scripts = os.path.join(SKILLS_DIR, skill, "scripts")
+        if not os.path.isdir(scripts):
+            continue
+        for name in sorted(os.listdir(scripts)):
+            if not name.endswith(".py"):
+                continue
+            path = os.path.join(scripts, name)
+            with open(path, "r", encoding="utf-8") as f:
+                if not _MAIN_GUARD.search(f.read()):
+                    continue
+            cases.append({"name": f"{name} --help", "argv": [path, "--help"]})
+    return cases
+
+
+def fixture_cases(workdir: str, task_id: str) -> list[dict]:
+    """Real entries, the way the skills call them, against the fixtures in `workdir`."""
+    project = os.path.join(workdir, "project", "src")
+    doc = os.path.join(workdir, "doc.md")
+    resolve = os.path.join(PI_SCRIPTS, "resolve-default.py")
+
+    def tts(script: str, *args: str) -> list[str]:
+        return [os.path.join(TTS_SCRIPTS, script), *args]
+
+    return [
+        {"name": "resolve-default.py", "argv": [resolve, project]},
+        {"name": "resolve-default.py --no-cache", "argv": [resolve, "--no-cache", project]},
+        {"name": "resolve-default.py --batch", "argv": [resolve, "--batch", project, workdir]},
+        {"name": "tts_submit.py", "argv": tts("tts_submit.py", "--no-cache", doc)},
+        {
+            "name": "tts_query.py",
+            "argv": tts("tts_query.py", "--no-cache", task_id, os.path.join(workdir, "out.mp3")),
+        },
+        {"name": "tts_cache.py list", "argv": tts("tts_cache.py", "list")},
+        {"name": "tts_journal.py list", "argv": tts("tts_journal.py", "list")},
+        {"name": "tts_ratelimit.py status", "argv": tts("tts_ratelimit.py", "status")},
+        {"name": "tts_retry.py status", "argv": tts("tts_retry.py", "status")},
+        {
+            "name": "tts_metrics.py",
+            "argv": tts("tts_metrics.py", os.path.join(workdir, "metrics.jsonl")),
+        },
+    ]
+
+
+def make_fixtures(workdir: str, base_url: str) -> dict:
+    """Write the fixture files and return the environment the scripts run with."""
+    agent = os.path.join(workdir, "agent")
+    os.makedirs(agent)
+    shutil.copy(os.path.join(BENCH_DIR, "..", "..", "pi", "agent", "modes.json"), agent)
+    os.makedirs(os.path.join(workdir, "project", ".git"))
+    os.makedirs(os.path.join(workdir, "project", ".pi"))
+    os.makedirs(os.path.join(workdir, "project", "src"))
+    with open(os.path.join(workdir, "project", ".pi", "modes.json"), "w", encoding="utf-8") as f:
+        json.dump({"modes": {"smart": {"provider": "bench", "modelId": "project"}}}, f)
+    with open(os.path.join(workdir, "doc.md"), "w", encoding="utf-8") as f:
+        f.write("# Startup\n\nA short document, so the run measures startup and not synthesis.\n")
+    with open(os.path.join(workdir, "metrics.jsonl"), "w", encoding="utf-8") as f:
+        for i in range(200):
+            phases = {"submit": 0.1 + i / 1000, "wait": 5 + i / 100, "download": 0.2}
+            f.write(json.dumps({"script": "tts_query", "status": "done", "phases": phases}) + "\n")
+    # Back-date everything so the mode resolver's cache is allowed to keep it.
+    old = time.time() - 60
+    for root, dirs, files in os.walk(workdir):
+        for name in dirs + files:
+            os.utime(os.path.join(root, name), (old, old))
+
+    env = dict(os.environ)
+    for name in ("TTS_METRICS", "TTS_METRICS_TEXTFILE"):
+        env.pop(name, None)
+    env.update(
+        VOLC_APP_ID="bench",
+        VOLC_ACCESS_KEY="bench",
+        VOLC_TTS_BASE_URL=base_url,
+        TTS_CACHE_DIR=os.path.join(workdir, "cache"),
+        TTS_JOURNAL=os.path.join(workdir, "journal.sqlite3"),
+        TTS_RATE_LIMIT="0",
+        XDG_RUNTIME_DIR=workdir,
+        XDG_STATE_HOME=os.path.join(workdir, "state"),
+        XDG_CACHE_HOME=os.path.join(workdir, "xdg-cache"),
+        PI_CODING_AGENT_DIR=agent,
+    )
+    env.pop("PI_MODES_CACHE_DIR", None)
+    return env
+
+
+def submit_fixture_task(base_url: str) -> str:
+    body = json.dumps({"req_params": {"text": "fixture"}}).encode()
+    req = urllib.request.Request(
+        f"{base_url}/api/v3/tts/submit", body, {"Content-Type": "application/json"}
+    )
+    with urllib.request.urlopen(req) as resp:
+        return json.load(resp)["data"]["task_id"]
+
+
+def run_once(argv: list[str], env: dict) -> tuple[float, int, int]:
+    """Wall seconds, peak RSS in bytes and exit status of one run."""
+    started = time.perf_counter()
+    proc = subprocess.Popen(argv, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    _, status, usage = os.wait4(proc.pid, 0)
+    elapsed = time.perf_counter() - started
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    return elapsed, usage.ru_maxrss * RSS_UNIT, proc.returncode
+
+
+def import_breakdown(argv: list[str], env: dict, top: int) -> tuple[float, list[dict]]:
+    """Total import milliseconds and the `top` slowest top-level imports of one run."""
+    out = subprocess.run(
+        [argv[0], "-X", "importtime", *argv[1:]],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    imports = []
+    for line in out.stderr.splitlines():
+        match = _IMPORTTIME.match(line)
+        if match and not match.group(3):  # top level only; nested ones are in its cumulative
+            imports.append({"module": match.group(4), "ms": int(match.group(2)) / 1000})
+    total = sum(item["ms"] for item in imports)
+    imports.sort(key=lambda item: item["ms"], reverse=True)
+    return total, imports[:top]
+
+
+def measure(argv: list[str], env: dict, runs: int, against: list[str] | None = None) -> dict:
+    """Wall time, peak RSS and exit statuses of `runs` launches.
+
+    With `against` (the bare interpreter), a launch of it follows each one of
+    `argv`, and `extra_ms` is the median difference of those pairs, which
+    cancels most of the drift in machine load.
+    """
+    samples, rss, codes, extra = [], [], set(), []
+    for _ in range(runs):
+        elapsed, peak, code = run_once(argv, env)
+        samples.append(elapsed)
+        rss.append(peak)
+        codes.add(code)
+        if against:
+            extra.append(elapsed - run_once(against, env)[0])
+    samples.sort()
+    result = {
+        "wall_ms_p50": statistics.median(samples) * 1e3,
+        "wall_ms_p95": samples[min(len(samples) - 1, round(0.95 * (len(samples) - 1)))] * 1e3,
+        "rss_mb": max(rss) / 2**20,
+        "exit": sorted(codes),
+    }
+    if against:
+        result["extra_ms"] = statistics.median(extra) * 1e3
+    return result
+
+
+def over_budget(name: str, result: dict, budgets: dict) -> list[str]:
+    budget = {**budgets.get("default", {}), **budgets.get("cases", {}).get(name, {})}
+    problems = []
+    if "extra_ms" in budget and result["extra_ms"] > budget["extra_ms"]:
+        extra = result["extra_ms"]
+        problems.append(f"{extra:.1f} ms over the interpreter > {budget['extra_ms']} ms")
+    if "rss_mb" in budget and result["rss_mb"] > budget["rss_mb"]:
+        problems.append(f"peak RSS {result['rss_mb']:.1f} MiB > {budget['rss_mb']} MiB")
+    if result["exit"] != [0]:
+        problems.append(f"exit status {result['exit']}")
+    return problems
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "-n", "--runs", type=int, default=20, help="Launches per case (default: 20)."
+    )
+    parser.add_argument("--only", default=None, help="Only cases whose name contains this.")
+    parser.add_argument("--top", type=int, default=3, help="Slowest imports shown per case.")
+    parser.add_argument(
+        "--budgets",
+        default=os.path.join(BENCH_DIR, "startup_budgets.json"),
+        help="Budget file (default: startup_budgets.json beside this script).",
+    )
+    parser.add_argument("--json", dest="json_out", default=None, help="Write the report here.")
+    args = parser.parse_args()
+
+    with open(args.budgets, "r", encoding="utf-8") as f:
+        budgets = json.load(f)
+    server = mock_openspeech.start(queue_delay=0.0)
+    workdir = tempfile.mkdtemp(prefix="skills-startup-")
+    try:
+        env = make_fixtures(workdir, server.base_url)
+        cases = help_cases() + fixture_cases(workdir, submit_fixture_task(server.base_url))
+        if args.only:
+            cases = [case for case in cases if args.only in case["name"]]
+        bare = [sys.executable, "-c", "pass"]
+        baseline = measure(bare, env, args.runs)
+        results = {}
+        for case in cases:
+            argv = [sys.executable, *case["argv"]]
+            measure(argv, env, 1)  # warm the page cache, the resolver cache and the journal
+            result = measure(argv, env, args.runs, against=bare)
+            result["import_ms"], result["imports"] = import_breakdown(argv, env, args.top)
+            result["over_budget"] = over_budget(case["name"], result, budgets)
+            results[case["name"]] = result
+    finally:
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    wall, rss = baseline["wall_ms_p50"], baseline["rss_mb"]
+    print(f"interpreter (python -c pass): {wall:.1f} ms, {rss:.1f} MiB")
+    header = ("case", "p50 ms", "p95 ms", "extra", "import", "RSS MiB")
+    print(f"{header[0]:<34}" + "".join(f"  {title:>7}" for title in header[1:]))
+    failed = 0
+    for name, result in results.items():
+        flag = "  OVER BUDGET" if result["over_budget"] else ""
+        columns = ("wall_ms_p50", "wall_ms_p95", "extra_ms", "import_ms", "rss_mb")
+        print(f"{name:<34}" + "".join(f"  {result[key]:>7.1f}" for key in columns) + flag)
+        slowest = ", ".join(f"{item['module']} {item['ms']:.1f}" for item in result["imports"])
+        print(f"{'':<36}{slowest}")
+        for problem in result["over_budget"]:
+            print(f"{'':<36}! {problem}")
+        failed += bool(result["over_budget"])
+
+    if args.json_out:
+        report = {"interpreter": baseline, "results": results}
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+    if failed:
+        print(f"{failed} case(s) over budget", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
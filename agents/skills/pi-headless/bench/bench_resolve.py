@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""Benchmark pi mode resolution with and without the stat-keyed cache.
+
+Builds a throwaway project and agent dir, then measures one resolution the way
+a fresh headless run pays for it (in-process, parse vs cache hit) and end to
+end as a spawned `resolve-default.py`, from a cwd `--depth` levels below the
+project root:
+
+    bench_resolve.py [--runs 50] [--modes 4] [--depth 0]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS = os.path.join(BENCH_DIR, "..", "scripts")
+sys.path.insert(0, SCRIPTS)
+
+import pi_modes  # noqa: E402
+
+
+def write_json(path: str, obj: dict) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(obj, f, indent=2)
+    # Back-date the file so the cache does not treat it as just written.
+    old = time.time() - 60
+    os.utime(path, (old, old))
+
+
+def modes_file(count: int) -> dict:
+    names = ["default", "rush", "smart", "deep"] + [f"extra-{i}" for i in range(count - 4)]
+    modes = {
+        name: {"provider": "bench", "modelId": f"{name}-model", "thinkingLevel": "medium"}
+        for name in names
+    }
+    return {"version": 1, "currentMode": "default", "modes": modes}
+
+
+def per_call_us(func, runs: int) -> float:
+    samples = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - t0)
+    return statistics.median(samples) * 1e6
+
+
+def spawn_ms(args: list[str], runs: int) -> float:
+    samples = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        subprocess.run(args, check=True, stdout=subprocess.DEVNULL)
+        samples.append(time.perf_counter() - t0)
+    return statistics.median(samples) * 1e3
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--runs", type=int, default=50, help="Samples per measurement.")
+    parser.add_argument(
+        "--modes", type=int, default=4, help="Modes per modes.json (default: 4, like pi's own)."
+    )
+    parser.add_argument(
+        "--depth", type=int, default=0, help="Levels between cwd and the project root (default: 0)."
+    )
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="pi-modes-bench-")
+    root = os.path.join(workdir, "project")
+    project = os.path.join(root, *[f"sub{i}" for i in range(args.depth)])
+    os.makedirs(os.path.join(root, ".git"))
+    os.makedirs(project, exist_ok=True)
+    os.environ.update(
+        PI_CODING_AGENT_DIR=os.path.join(workdir, "agent"),
+        PI_MODES_CACHE_DIR=os.path.join(workdir, "cache"),
+    )
+    # The project overrides no mode here, so every lookup reads both files.
+    write_json(os.path.join(root, ".pi", "modes.json"), {"modes": {}})
+    write_json(os.path.join(workdir, "agent", "modes.json"), modes_file(max(4, args.modes)))
+    old = time.time() - 60
+    for directory, _, _ in os.walk(root):
+        os.utime(directory, (old, old))
+
+    def parse() -> None:
+        pi_modes._parsed.clear()
+        pi_modes._dirs.clear()
+        pi_modes.resolve("deep", project)
+
+    def disk_hit() -> None:
+        pi_modes._parsed.clear()
+        pi_modes._dirs.clear()
+        pi_modes.resolve_cached("deep", project)
+
+    try:
+        results = {
+            "parse_us": per_call_us(parse, args.runs),
+            "memo_hit_us": per_call_us(lambda: pi_modes.resolve("deep", project), args.runs),
+            "disk_hit_us": per_call_us(disk_hit, args.runs),
+        }
+        script = os.path.join(SCRIPTS, "resolve-default.py")
+        results["spawn_no_cache_ms"] = spawn_ms(
+            [sys.executable, script, "--no-cache", "-m", "deep", project], args.runs
+        )
+        results["spawn_cached_ms"] = spawn_ms(
+            [sys.executable, script, "-m", "deep", project], args.runs
+        )
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    for name, value in results.items():
+        print(f"{name:<20}  {value:>10.3f}")
+    saved = results["spawn_no_cache_ms"] - results["spawn_cached_ms"]
+    print(f"{'saved_per_run_ms':<20}  {saved:>10.3f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""The resolver's on-disk cache must never answer for another chain of modes.json files.
+
+Runs `resolve-default.py` the way piw and ralph do, against throwaway agent dirs:
+
+    python -m unittest test_resolve_cache.py
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+RESOLVE = os.path.join(BENCH_DIR, "..", "scripts", "resolve-default.py")
+
+
+class CacheInvalidation(unittest.TestCase):
+    def setUp(self) -> None:
+        self.workdir = tempfile.mkdtemp(prefix="pi-modes-test-")
+        self.cwd = os.path.join(self.workdir, "project")
+        os.makedirs(os.path.join(self.cwd, ".git"))
+        for name, model in (("agent1", "g/gs"), ("agent2", "OTHER/agent2")):
+            provider, model_id = model.split("/")
+            path = os.path.join(self.workdir, name, "modes.json")
+            os.makedirs(os.path.dirname(path))
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({"modes": {"smart": {"provider": provider, "modelId": model_id}}}, f)
+        # Back-date everything so the cache is allowed to keep it.
+        old = time.time() - 60
+        for root, dirs, files in os.walk(self.workdir):
+            for name in dirs + files:
+                os.utime(os.path.join(root, name), (old, old))
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def resolve(self, agent: str, *args: str) -> str:
+        env = dict(
+            os.environ,
+            PI_CODING_AGENT_DIR=os.path.join(self.workdir, agent),
+            PI_MODES_CACHE_DIR=os.path.join(self.workdir, "cache"),
+        )
+        out = subprocess.run(
+            [sys.executable, RESOLVE, *args, self.cwd],
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        return out.stdout.split("\n")[0]
+
+    def test_cache_hit(self) -> None:
+        self.assertEqual(self.resolve("agent1"), "g/gs")
+        self.assertTrue(os.listdir(os.path.join(self.workdir, "cache")))
+        self.assertEqual(self.resolve("agent1"), "g/gs")
+
+    def test_switching_agent_dir_invalidates(self) -> None:
+        self.assertEqual(self.resolve("agent1"), "g/gs")
+        self.assertEqual(self.resolve("agent2"), "OTHER/agent2")
+        self.assertEqual(self.resolve("agent2", "--no-cache"), "OTHER/agent2")
+        self.assertEqual(self.resolve("agent1"), "g/gs")
+
+
+if __name__ == "__main__":
+    unittest.main()
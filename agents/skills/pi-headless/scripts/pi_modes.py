@@ -0,0 +1,513 @@
+#!/usr/bin/env python3
+"""Resolve pi modes (model and thinking level) from the modes.json chain.
+
+The nearest project-level `.pi/modes.json`, looked for from cwd up to the
+repository root (a directory with `.git`) or the filesystem root, takes
+precedence, then the global `~/.pi/agent/modes.json` (honoring
+PI_CODING_AGENT_DIR); each mode is looked up independently, so a project file
+may override only some modes.
+
+Importable, so long-running callers resolve in-process:
+
+    import pi_modes
+    spec = pi_modes.resolve("deep", cwd)   # {"model": "provider/id", "thinking": "..."} or None
+    specs = pi_modes.resolve_all(cwd)      # every mode defined anywhere in the chain
+
+Run through `resolve-default.py`, it prints two lines for one mode (default: smart):
+  line 1: model as `provider/modelId`
+  line 2: thinkingLevel (may be empty)
+If the mode is absent or malformed, both lines are empty so the caller can
+fall back to pi's own defaults by omitting --model/--thinking.
+
+`--batch` resolves every mode (or the `-m` ones) for many cwds in one process,
+taken from the arguments or, with none or `-`, one per line from stdin:
+
+    git worktree list --porcelain | sed -n 's/^worktree //p' | resolve-default.py --batch
+    eval "$(resolve-default.py --batch --format shell "$PWD")"; echo "${PI_MODEL[deep:$PWD]}"
+
+It prints one NDJSON record per cwd and mode ({"cwd", "mode", "model",
+"thinking"}), or with `--format shell` bash assignments to the associative
+arrays PI_MODEL and PI_THINKING, keyed `<mode>:<cwd>`.
+
+`--watch` keeps running for long-lived loops: it prints `model<TAB>thinking`
+for one mode and cwd, then a new line only when that resolution changes. It
+follows every candidate modes.json, its directory and the directories walked
+to find it with inotify, or polls every `--interval` seconds where inotify is
+not available (macOS):
+
+    coproc MODES { resolve-default.py --watch; }
+    IFS=$'\t' read -r -u "${MODES[0]}" model thinking
+
+Parsed files and directory lookups are memoized per process and script results
+are cached in `$XDG_CACHE_HOME/pi-modes` (PI_MODES_CACHE_DIR overrides, `off`
+disables), all keyed on the (inode, size, mtime_ns) of every file and directory
+they depend on, so an unchanged chain is answered from one stat() per path
+without reading any JSON.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import shlex
+import sys
+import time
+import zlib
+from pathlib import Path
+from typing import Iterable, Iterator
+
+DEFAULT_MODE = "smart"
+# Files modified this recently are not cached: another write within the same
+# mtime tick could keep inode, size and mtime_ns unchanged.
+RACY_NS = 2_000_000_000
+# inotify(7) event bits. Walked directories only matter when an entry such as
+# .pi or .git comes or goes; modes.json and its directory also on every write.
+IN_MODIFY = 0x002
+IN_ATTRIB = 0x004
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_DELETE_SELF = 0x400
+IN_MOVE_SELF = 0x800
+DIR_MASK = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE_SELF | IN_MOVE_SELF
+PARENT_MASK = DIR_MASK | IN_CLOSE_WRITE | IN_ATTRIB
+FILE_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_ATTRIB | IN_DELETE_SELF | IN_MOVE_SELF
+# Editors save in several steps; let a burst of events settle before resolving.
+SETTLE = 0.05
+
+_parsed: dict[Path, tuple[str, dict]] = {}
+_dirs: dict[str, tuple[list[str], str]] = {}
+
+
+def global_agent_dir() -> Path:
+    env = os.environ.get("PI_CODING_AGENT_DIR")
+    if env:
+        return Path(env).expanduser()
+    return Path.home() / ".pi" / "agent"
+
+
+def stat_key(path: Path) -> str:
+    """`path` with its inode, size and mtime_ns; `-` when it cannot be stat'ed."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return f"{path}\t-"
+    return f"{path}\t{st.st_ino}:{st.st_size}:{st.st_mtime_ns}"
+
+
+def _racy(keys: list[str]) -> bool:
+    now = time.time_ns()
+    for key in keys:
+        stamp = key.rsplit("\t", 1)[1]
+        if stamp != "-" and now - int(stamp.rsplit(":", 1)[1]) < RACY_NS:
+            return True
+    return False
+
+
+def _unchanged(keys: list[str]) -> bool:
+    return all(stat_key(Path(key.rsplit("\t", 1)[0])) == key for key in keys)
+
+
+def _probe(directory: str) -> tuple[list[str], str]:
+    """Stat keys and verdict of one directory on the way up from cwd.
+
+    The verdict is `project` (it has .pi/modes.json), `repo` (its .git ends the
+    walk) or `none`. A directory seen before is answered by re-stat'ing only
+    itself and its .pi, if it had one: creating .pi or .git changes the
+    directory's mtime, adding or removing modes.json that of .pi.
+    """
+    hit = _dirs.get(directory)
+    if hit is not None and _unchanged(hit[0]):
+        return hit
+    keys = [stat_key(Path(directory))]
+    pi = Path(directory, ".pi")
+    pi_key = stat_key(pi)
+    if not pi_key.endswith("\t-"):
+        keys.append(pi_key)
+    if (pi / "modes.json").is_file():
+        verdict = "project"
+    elif os.path.lexists(os.path.join(directory, ".git")):
+        verdict = "repo"
+    else:
+        verdict = "none"
+    if not _racy(keys):
+        _dirs[directory] = (keys, verdict)
+    return keys, verdict
+
+
+def discover(cwd: str, shared: dict | None = None) -> tuple[Path | None, list[str]]:
+    """The nearest .pi/modes.json at or above `cwd`, and the stat keys of the directories walked.
+
+    `shared` holds the answers of this walk for every directory it passed, so
+    later walks from siblings stop at the first common ancestor. The returned list
+    may be one of those answers or the memo's own; callers must not modify it.
+    """
+    shared = {} if shared is None else shared
+    directory = os.path.abspath(cwd)
+    pending = []
+    while directory not in shared:
+        keys, verdict = _probe(directory)
+        parent = os.path.dirname(directory)
+        if verdict == "project":
+            shared[directory] = (Path(directory, ".pi", "modes.json"), keys)
+        elif verdict == "repo" or parent == directory:
+            shared[directory] = (None, keys)
+        else:
+            pending.append((directory, keys))
+            directory = parent
+    found, keys = shared[directory]
+    for directory, own in reversed(pending):
+        keys = own + keys
+        shared[directory] = (found, keys)
+    return found, keys
+
+
+def candidate_paths(cwd: str, shared: dict | None = None) -> list[Path]:
+    found, _ = discover(cwd, shared)
+    return ([found] if found else []) + [global_agent_dir() / "modes.json"]
+
+
+def load_modes(path: Path) -> dict:
+    """The `modes` object of one modes.json; empty if missing or malformed."""
+    key = stat_key(path)
+    hit = _parsed.get(path)
+    if hit is not None and hit[0] == key:
+        return hit[1]
+    modes = _read_modes(path)
+    if not _racy([key]):
+        _parsed[path] = (key, modes)
+    return modes
+
+
+def _read_modes(path: Path) -> dict:
+    import json  # only needed on a cache miss
+
+    try:
+        raw = path.read_text(encoding="utf-8")
+    except OSError:
+        return {}
+    try:
+        parsed = json.loads(raw)
+    except json.JSONDecodeError:
+        return {}
+    if not isinstance(parsed, dict):
+        return {}
+    modes = parsed.get("modes")
+    if not isinstance(modes, dict):
+        return {}
+    return modes
+
+
+def parse_spec(spec: object) -> dict | None:
+    if not isinstance(spec, dict):
+        return None
+    provider = spec.get("provider")
+    model_id = spec.get("modelId")
+    if not isinstance(provider, str) or not isinstance(model_id, str):
+        return None
+    thinking = spec.get("thinkingLevel")
+    return {
+        "model": f"{provider}/{model_id}",
+        "thinking": thinking if isinstance(thinking, str) else "",
+    }
+
+
+def read_spec(path: Path, mode: str = DEFAULT_MODE) -> dict | None:
+    return parse_spec(load_modes(path).get(mode))
+
+
+def _chain(
+    cwd: str, loaded: dict[Path, dict] | None = None, shared: dict | None = None
+) -> list[dict]:
+    """The `modes` objects along the chain for `cwd`, highest precedence first.
+
+    Files already in `loaded` are not looked at again; new ones are added to it.
+    `shared` is passed on to discover().
+    """
+    chain = []
+    for path in candidate_paths(cwd, shared):
+        if loaded is None:
+            chain.append(load_modes(path))
+            continue
+        if path not in loaded:
+            loaded[path] = load_modes(path)
+        chain.append(loaded[path])
+    return chain
+
+
+def _pick(chain: list[dict], mode: str) -> dict | None:
+    for modes in chain:
+        spec = parse_spec(modes.get(mode))
+        if spec is not None:
+            return spec
+    return None
+
+
+def resolve(mode: str = DEFAULT_MODE, cwd: str | None = None) -> dict | None:
+    """The first valid `mode` spec along the chain for `cwd`, or None."""
+    return _pick(_chain(cwd or os.getcwd()), mode)
+
+
+def cache_dir() -> Path | None:
+    env = os.environ.get("PI_MODES_CACHE_DIR")
+    if env == "off":
+        return None
+    if env:
+        return Path(env).expanduser()
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "pi-modes"
+
+
+def resolve_cached(mode: str = DEFAULT_MODE, cwd: str | None = None) -> dict | None:
+    """resolve(), answered from the on-disk cache while nothing it depends on changed.
+
+    An entry is one small text file per mode, cwd and global modes.json path
+    (PI_CODING_AGENT_DIR or HOME may point elsewhere next time): those three, the
+    model and thinking level (a missing mode is cached as well), then the
+    stat_key() of every directory walked and every modes.json read. A hit
+    re-stats exactly those paths; editing a file rewrites the entry in place,
+    so the cache grows only with the number of directories (and agent dirs)
+    resolved from.
+    """
+    directory = cache_dir()
+    if directory is None:
+        return resolve(mode, cwd)
+    cwd = os.path.abspath(cwd or os.getcwd())
+    global_modes = global_agent_dir() / "modes.json"
+    head = f"{mode}\t{cwd}\t{global_modes}"
+    entry = directory / f"{zlib.crc32(head.encode()):08x}"
+    try:
+        lines = entry.read_text(encoding="utf-8").split("\n")
+    except (OSError, UnicodeDecodeError):
+        lines = []
+    if len(lines) > 4 and lines[0] == head and not lines[-1] and _unchanged(lines[3:-1]):
+        return {"model": lines[1], "thinking": lines[2]} if lines[1] else None
+    found, keys = discover(cwd)
+    paths = ([found] if found else []) + [global_modes]
+    keys = keys + [stat_key(path) for path in paths]  # discover()'s list is memoized
+    spec = resolve(mode, cwd)
+    if not _racy(keys):
+        model, thinking = (spec["model"], spec["thinking"]) if spec else ("", "")
+        try:
+            directory.mkdir(parents=True, exist_ok=True)
+            tmp = entry.with_name(f"{entry.name}.{os.getpid()}.tmp")
+            tmp.write_text("\n".join([head, model, thinking, *keys, ""]), encoding="utf-8")
+            os.replace(tmp, entry)
+        except OSError:
+            pass  # caching is best effort
+    return spec
+
+
+def resolve_all(cwd: str | None = None) -> dict[str, dict]:
+    """Every mode defined in the chain for `cwd`, each resolved as resolve() would."""
+    return {mode: spec for _, mode, spec in resolve_batch([cwd or os.getcwd()])}
+
+
+def resolve_batch(
+    cwds: Iterable[str], modes: list[str] | None = None
+) -> Iterator[tuple[str, str, dict | None]]:
+    """Yield (cwd, mode, spec) for each cwd and each of `modes` (default: all defined ones).
+
+    Every distinct modes.json is stat'ed and parsed once for the whole batch, so
+    worktrees that all fall back to the global file share it, and each ancestor
+    directory is looked at once however many cwds lie below it. Requested modes
+    that resolve nowhere are yielded with spec None; with `modes` unset, only
+    modes that resolve are.
+    """
+    loaded: dict[Path, dict] = {}
+    shared: dict = {}
+    for cwd in cwds:
+        chain = _chain(cwd, loaded, shared)
+        # Global file order first, then modes only a project defines.
+        names = modes or list(dict.fromkeys(n for defined in reversed(chain) for n in defined))
+        for mode in names:
+            spec = _pick(chain, mode)
+            if spec is not None or modes:
+                yield cwd, mode, spec
+
+
+def print_batch(results: Iterable[tuple[str, str, dict | None]], fmt: str) -> None:
+    if fmt == "shell":
+        print("declare -gA PI_MODEL PI_THINKING")
+    else:
+        import json
+
+    for cwd, mode, spec in results:
+        model, thinking = (spec["model"], spec["thinking"]) if spec else ("", "")
+        if fmt == "shell":
+            key = shlex.quote(f"{mode}:{cwd}")
+            print(f"PI_MODEL[{key}]={shlex.quote(model)}")
+            print(f"PI_THINKING[{key}]={shlex.quote(thinking)}")
+        else:
+            record = {"cwd": cwd, "mode": mode, "model": model, "thinking": thinking}
+            print(json.dumps(record, ensure_ascii=False))
+
+
+class Inotify:
+    """Just enough of inotify(7) over ctypes; raises OSError where it is not available."""
+
+    def __init__(self) -> None:
+        import ctypes
+
+        try:
+            libc = ctypes.CDLL(None, use_errno=True)
+            init, self._add, self._rm = (
+                libc.inotify_init1,
+                libc.inotify_add_watch,
+                libc.inotify_rm_watch,
+            )
+        except AttributeError as exc:
+            raise OSError("inotify is not available") from exc
+        self._add.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        # IN_NONBLOCK and IN_CLOEXEC share their values with the O_ flags.
+        self.fd = init(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.wds: set[int] = set()
+
+    def watch(self, targets: dict[str, int]) -> None:
+        """Watch exactly `targets` (path -> event mask); missing paths are skipped.
+
+        Every path is re-added each time, which is a no-op for an unchanged one
+        and picks up a file that was replaced by a new inode.
+        """
+        wds = set()
+        for path, mask in targets.items():
+            wd = self._add(self.fd, os.fsencode(path), mask)
+            if wd >= 0:
+                wds.add(wd)
+        for wd in self.wds - wds:
+            self._rm(self.fd, wd)  # fails harmlessly if the kernel dropped it already
+        self.wds = wds
+
+    def wait(self) -> None:
+        """Block until something changed, then drain the queued events."""
+        import select
+
+        select.select([self.fd], [], [])
+        time.sleep(SETTLE)
+        try:
+            while os.read(self.fd, 65536):
+                pass
+        except BlockingIOError:
+            pass
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+def watch_targets(cwd: str) -> dict[str, int]:
+    """Paths whose changes can alter the resolution for `cwd`, with their inotify masks."""
+    found, keys = discover(cwd)
+    targets = {}
+    for key in keys:
+        path = key.rsplit("\t", 1)[0]
+        targets[path] = PARENT_MASK if os.path.basename(path) == ".pi" else DIR_MASK
+    global_file = global_agent_dir() / "modes.json"
+    # Until the agent dir exists, its nearest existing ancestor says when it appears.
+    parent = global_file.parent
+    while not parent.is_dir() and parent != parent.parent:
+        parent = parent.parent
+    targets[str(parent)] = PARENT_MASK
+    for path in ([found] if found else []) + [global_file]:
+        targets[str(path)] = FILE_MASK
+    return targets
+
+
+def watch(
+    mode: str = DEFAULT_MODE, cwd: str | None = None, interval: float = 2.0
+) -> Iterator[dict | None]:
+    """Yield the resolution of `mode` for `cwd` now, then again each time it changes."""
+    cwd = os.path.abspath(cwd or os.getcwd())
+    try:
+        notify = Inotify()
+    except OSError:
+        notify = None
+    last: object = ()
+    try:
+        while True:
+            if notify is not None:
+                # Arm before resolving, so an edit in between still wakes us up.
+                notify.watch(watch_targets(cwd))
+            spec = resolve(mode, cwd)
+            if spec != last:
+                yield spec
+                last = spec
+            if notify is not None:
+                notify.wait()
+            else:
+                time.sleep(interval)
+    finally:
+        if notify is not None:
+            notify.close()
+
+
+def main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(description="Print the model and thinking level of a pi mode.")
+    parser.add_argument(
+        "cwd", nargs="*", help="Project directory (default: cwd); several with --batch."
+    )
+    parser.add_argument(
+        "-m",
+        "--mode",
+        action="append",
+        default=None,
+        help=f"Mode to resolve (default: {DEFAULT_MODE}; every mode with --batch). Repeatable.",
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true", help="Read the modes.json files even if unchanged."
+    )
+    parser.add_argument(
+        "--batch", action="store_true", help="Resolve many cwds (args, or stdin with none or `-`)."
+    )
+    parser.add_argument(
+        "--format",
+        choices=("ndjson", "shell"),
+        default="ndjson",
+        help="Batch output: NDJSON records or bash assignments (default: ndjson).",
+    )
+    parser.add_argument(
+        "--watch", action="store_true", help="Keep running; print a line whenever the mode changes."
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=2.0,
+        help="Seconds between checks with --watch where inotify is unavailable (default: 2).",
+    )
+    args = parser.parse_args(argv[1:])
+
+    if args.batch and args.watch:
+        parser.error("--watch follows one cwd and mode; it does not combine with --batch")
+    if args.batch:
+        cwds = args.cwd
+        if not cwds or cwds == ["-"]:
+            cwds = (line.rstrip("\n") for line in sys.stdin if line.strip())
+        print_batch(resolve_batch(cwds, args.mode), args.format)
+        return 0
+    if len(args.cwd) > 1 or (args.mode and len(args.mode) > 1):
+        parser.error("one cwd and one mode at a time; use --batch for more")
+
+    mode = args.mode[0] if args.mode else DEFAULT_MODE
+    cwd = args.cwd[0] if args.cwd else None
+    if args.watch:
+        try:
+            for spec in watch(mode, cwd, args.interval):
+                spec = spec or {"model": "", "thinking": ""}
+                print(f"{spec['model']}\t{spec['thinking']}", flush=True)
+        except KeyboardInterrupt:
+            pass
+        except BrokenPipeError:
+            # The reader went away; keep the final flush at exit from failing again.
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 0
+    lookup = resolve if args.no_cache else resolve_cached
+    spec = lookup(mode, cwd) or {"model": "", "thinking": ""}
+    print(spec["model"])
+    print(spec["thinking"])
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv))
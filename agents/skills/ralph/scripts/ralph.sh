@@ -21,20 +21,39 @@ fi
 SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 PROGRESS_FILE="$SPEC_DIR/progress.txt"
 
-# Resolve model/thinking from pi's `smart` mode in modes.json.
-mapfile -t cfg < <("$SCRIPT_DIR/resolve-default.py")
-model="${cfg[0]:-}"
-thinking="${cfg[1]:-}"
+# Resolve model/thinking from pi's `smart` mode in modes.json. The resolver
+# belongs to the pi-headless skill (a dependency declared in SKILL.md) and keeps
+# running in --watch mode, so edits to modes.json reach the next iteration
+# without re-spawning it.
+RESOLVER="${RALPH_MODES_RESOLVER:-$SCRIPT_DIR/../../pi-headless/scripts/resolve-default.py}"
+if [[ ! -x "$RESOLVER" ]]; then
+  echo "ralph: error: pi mode resolver not found at $RESOLVER" >&2
+  echo "Install the pi-headless skill next to ralph, or set RALPH_MODES_RESOLVER to its scripts/resolve-default.py" >&2
+  exit 1
+fi
+coproc MODES { exec "$RESOLVER" --watch; }
+exec {modes_fd}<&"${MODES[0]}"
+trap 'kill "$MODES_PID" 2>/dev/null' EXIT
+IFS=$'\t' read -r -u "$modes_fd" model thinking || true
 if [[ -z "$model" ]]; then
   echo "ralph: error: no 'smart' mode resolved from modes.json" >&2
-  echo "Configure modes.smart with provider and modelId in <cwd>/.pi/modes.json or ~/.pi/agent/modes.json" >&2
+  echo "Configure modes.smart with provider and modelId in the project's .pi/modes.json or ~/.pi/agent/modes.json" >&2
   echo "List available models with: pi --list-models" >&2
   exit 1
 fi
-args=(pi --no-session --model "$model")
-if [[ -n "$thinking" ]]; then
-  args+=(--thinking "$thinking")
-fi
+
+# Take the latest resolution the watcher reported; keep the current model if
+# the mode was removed meanwhile.
+refresh_model() {
+  local m t
+  while IFS=$'\t' read -r -t 0.1 -u "$modes_fd" m t; do
+    if [[ -n "$m" && ( "$m" != "$model" || "$t" != "$thinking" ) ]]; then
+      echo "ralph: modes.json changed, now using $m ${t:+($t)}" >&2
+      model="$m"
+      thinking="$t"
+    fi
+  done
+}
 
 # Initialize progress file if it doesn't exist
 if [ ! -f "$PROGRESS_FILE" ]; then
@@ -48,6 +67,11 @@ for i in $(seq 1 $MAX_ITERATIONS); do
   echo "==============================================================="
   echo "  Ralph Iteration $i of $MAX_ITERATIONS"
   echo "==============================================================="
+  refresh_model
+  args=(pi --no-session --model "$model")
+  if [[ -n "$thinking" ]]; then
+    args+=(--thinking "$thinking")
+  fi
   # Run pi agent
   OUTPUT=$(cat "$SCRIPT_DIR/../references/RALPH.md" | sed "s|{{SPEC_DIR}}|$SPEC_DIR|g" | "${args[@]}" -p 2>&1 | tee /dev/stderr) || true
   
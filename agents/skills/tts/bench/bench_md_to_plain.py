@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""Micro-benchmark: single-pass md_to_plain() vs the previous nine-regex version."""
+
+import argparse
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+# tts_submit reads credentials at import time; cleaning needs none.
+os.environ.setdefault("VOLC_APP_ID", "bench")
+os.environ.setdefault("VOLC_ACCESS_KEY", "bench")
+
+from tts_submit import md_to_plain  # noqa: E402
+
+SAMPLE = """# Heading {n}
+
+> A quoted **remark** with a [link](https://example.com/{n}) and `inline code`.
+
+Some paragraph text with *emphasis*, __strong__ words and plain prose that goes on
+for a while so the line looks like a real note written in Markdown, number {n}.
+这是一段中文内容，用来模拟混合语言的笔记。
+
+- first item
+- second item with [another link](https://example.com)
+* third _item_
+
+```python
+def handler_{n}(event):
+    return {{"ok": True}}
+```
+
+---
+
+"""
+
+
+def legacy_md_to_plain(text: str) -> str:
+    """The original implementation, kept verbatim for comparison."""
+    text = re.sub(r"^>\s?", "", text, flags=re.MULTILINE)
+    text = re.sub(r"^#{1,6}\s+", "", text, flags=re.MULTILINE)
+    text = re.sub(r"\[([^\]]+)\]\([^)]+\)", r"\1", text)
+    text = re.sub(r"\*\*?|\_\_?", "", text)
+    text = re.sub(r"`+", "", text)
+    text = re.sub(r"```[\s\S]*?```", "", text)
+    text = re.sub(r"^---+\s*$", "", text, flags=re.MULTILINE)
+    text = re.sub(r"^\s*[-*+]\s+", "", text, flags=re.MULTILINE)
+    text = re.sub(r"\n{3,}", "\n\n", text)
+    return text.strip()
+
+
+def corpus(size_kb: int) -> str:
+    parts = []
+    total = 0
+    n = 0
+    while total < size_kb * 1024:
+        block = SAMPLE.format(n=n)
+        parts.append(block)
+        total += len(block.encode("utf-8"))
+        n += 1
+    return "".join(parts)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--sizes", default="64,1024,8192", help="Corpus sizes in KiB, comma-separated."
+    )
+    parser.add_argument("-n", "--repeat", type=int, default=5, help="Best-of repetitions.")
+    args = parser.parse_args()
+
+    print(f"{'size':>8}  {'legacy ms':>10}  {'single ms':>10}  {'speedup':>8}  {'MB/s':>7}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        text = corpus(size)
+        legacy = min(timeit.repeat(lambda: legacy_md_to_plain(text), number=1, repeat=args.repeat))
+        single = min(timeit.repeat(lambda: md_to_plain(text), number=1, repeat=args.repeat))
+        mbps = len(text.encode("utf-8")) / single / 1e6
+        print(
+            f"{size:>6}Ki  {legacy * 1e3:>10.1f}  {single * 1e3:>10.1f}"
+            f"  {legacy / single:>7.2f}x  {mbps:>7.1f}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
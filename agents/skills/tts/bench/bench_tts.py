@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""Benchmark suite for the TTS scripts against the local mock server.
+
+Measures md_to_plain() throughput, submit rate, polling overhead and download
+speed, and writes a JSON report that a later run can be compared against:
+
+    bench_tts.py --json base.json
+    bench_tts.py --compare base.json   # exits 1 on a regression beyond --tolerance
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "scripts"))
+
+import mock_openspeech  # noqa: E402
+
+# Metric name -> True when higher is better.
+METRICS = {
+    "md_to_plain_mb_s": True,
+    "submit_ms_p50": False,
+    "submit_ms_p95": False,
+    "submit_per_s": True,
+    "submit_parallel_per_s": True,
+    "query_ms_p50": False,
+    "poll_overshoot_s": False,
+    "polls_per_task": False,
+    "download_mb_s": True,
+}
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, round(pct / 100 * (len(ordered) - 1)))]
+
+
+# The scripts read their endpoint at import time, so each benchmark imports them
+# only after main() has pointed the environment at the mock server.
+
+
+def bench_clean(size_kb: int, repeat: int) -> dict:
+    from bench_md_to_plain import corpus
+    from tts_submit import md_to_plain
+
+    text = corpus(size_kb)
+    best = min(timeit.repeat(lambda: md_to_plain(text), number=1, repeat=repeat))
+    return {"md_to_plain_mb_s": len(text.encode("utf-8")) / best / 1e6}
+
+
+def bench_submit(count: int, jobs: int) -> dict:
+    from tts_submit import make_session, submit_task
+
+    latencies = []
+    with make_session() as session:
+        submit_task("warm-up", session)
+        started = time.perf_counter()
+        for i in range(count):
+            t0 = time.perf_counter()
+            submit_task(f"benchmark sentence {i}.", session)
+            latencies.append(time.perf_counter() - t0)
+        serial = time.perf_counter() - started
+    with make_session(jobs) as session, ThreadPoolExecutor(max_workers=jobs) as pool:
+        started = time.perf_counter()
+        list(pool.map(lambda i: submit_task(f"parallel sentence {i}.", session), range(count)))
+        parallel = time.perf_counter() - started
+    return {
+        "submit_ms_p50": statistics.median(latencies) * 1e3,
+        "submit_ms_p95": percentile(latencies, 95) * 1e3,
+        "submit_per_s": count / serial,
+        "submit_parallel_per_s": count / parallel,
+    }
+
+
+def bench_poll(server: mock_openspeech.MockServer, tasks: int, count: int) -> dict:
+    """Round-trip cost of one query, and how late / how often wait_for_task polls."""
+    from tts_query import query_task, wait_for_task
+    from tts_submit import make_session, submit_task
+
+    with make_session(tasks) as session:
+        task_id = submit_task("query latency", session)["data"]["task_id"]
+        latencies = []
+        for _ in range(count):
+            t0 = time.perf_counter()
+            query_task(task_id, session)
+            latencies.append(time.perf_counter() - t0)
+
+        def one(i: int) -> float:
+            task_id = submit_task(f"poll overhead {i}.", session)["data"]["task_id"]
+            ready = server.tasks[task_id]["ready"]
+            wait_for_task(task_id, session)
+            return time.monotonic() - ready
+
+        queries_before = server.stats["query"]
+        with ThreadPoolExecutor(max_workers=tasks) as pool:
+            overshoot = list(pool.map(one, range(tasks)))
+        polls = (server.stats["query"] - queries_before) / tasks
+    return {
+        "query_ms_p50": statistics.median(latencies) * 1e3,
+        "poll_overshoot_s": statistics.median(overshoot),
+        "polls_per_task": polls,
+    }
+
+
+def bench_download(base_url: str, size_mb: int, repeat: int, workdir: str) -> dict:
+    from tts_query import download_audio
+    from tts_submit import make_session
+
+    output = os.path.join(workdir, "download.mp3")
+    best = float("inf")
+    with make_session() as session:
+        for _ in range(repeat):
+            if os.path.exists(output):
+                os.remove(output)
+            t0 = time.perf_counter()
+            download_audio(f"{base_url}/audio/bench.mp3", output, session)
+            best = min(best, time.perf_counter() - t0)
+        size = os.path.getsize(output)
+    return {"download_mb_s": size / best / 1e6}
+
+
+def git_revision() -> str | None:
+    try:
+        out = subprocess.run(
+            ["git", "-C", BENCH_DIR, "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> int:
+    """Print per-metric change against `baseline`; count regressions beyond `tolerance`."""
+    regressions = 0
+    print(f"{'metric':<24}  {'baseline':>10}  {'current':>10}  {'change':>8}")
+    for name, higher_better in METRICS.items():
+        old, new = baseline.get(name), results.get(name)
+        if old is None or new is None:
+            continue
+        change = (new - old) / old if old else 0.0
+        worse = -change if higher_better else change
+        flag = ""
+        if worse > tolerance:
+            regressions += 1
+            flag = "  REGRESSION"
+        print(f"{name:<24}  {old:>10.3f}  {new:>10.3f}  {change:>+7.1%}{flag}")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--clean-kb", type=int, default=1024, help="md_to_plain corpus size in KiB.")
+    parser.add_argument("--submits", type=int, default=200, help="Submit calls per measurement.")
+    parser.add_argument("-j", "--jobs", type=int, default=8, help="Threads for parallel submits.")
+    parser.add_argument("--queries", type=int, default=200, help="Query calls for round-trip cost.")
+    parser.add_argument("--poll-tasks", type=int, default=4, help="Tasks waited on for overshoot.")
+    parser.add_argument(
+        "--queue-delay", type=float, default=2.0, help="Mock server seconds to done (default: 2)."
+    )
+    parser.add_argument("--download-mb", type=int, default=32, help="Served audio size in MiB.")
+    parser.add_argument("-n", "--repeat", type=int, default=3, help="Best-of repetitions.")
+    parser.add_argument(
+        "--only", default=None, help="Comma-separated subset of clean,submit,poll,download."
+    )
+    parser.add_argument("--json", dest="json_out", default=None, help="Write the report here.")
+    parser.add_argument("--compare", default=None, help="Baseline report to compare against.")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.2, help="Allowed relative slowdown (default: 0.2)."
+    )
+    args = parser.parse_args()
+    only = set(args.only.split(",")) if args.only else {"clean", "submit", "poll", "download"}
+
+    server = mock_openspeech.start(
+        audio=mock_openspeech.silent_mp3(args.download_mb * 1024 * 1024),
+        queue_delay=args.queue_delay,
+    )
+    workdir = tempfile.mkdtemp(prefix="tts-bench-")
+    # Must be set before the scripts are imported; keep the user's cache and journal untouched.
+    os.environ.update(
+        VOLC_APP_ID="bench",
+        VOLC_ACCESS_KEY="bench",
+        VOLC_TTS_BASE_URL=server.base_url,
+        TTS_CACHE_DIR=os.path.join(workdir, "cache"),
+        TTS_JOURNAL=os.path.join(workdir, "journal.sqlite3"),
+        TTS_RATE_LIMIT="0",  # measure the scripts, not the shared quota
+        XDG_RUNTIME_DIR=workdir,
+    )
+
+    for name in ("TTS_METRICS", "TTS_METRICS_TEXTFILE"):
+        os.environ.pop(name, None)
+
+    results: dict[str, float] = {}
+    try:
+        if "clean" in only:
+            results.update(bench_clean(args.clean_kb, args.repeat))
+        if "submit" in only:
+            results.update(bench_submit(args.submits, max(1, args.jobs)))
+        if "poll" in only:
+            results.update(bench_poll(server, max(1, args.poll_tasks), args.queries))
+        if "download" in only:
+            results.update(bench_download(server.base_url, args.download_mb, args.repeat, workdir))
+    finally:
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "params": {k: v for k, v in vars(args).items() if k not in ("json_out", "compare")},
+        },
+        "results": {name: round(value, 4) for name, value in results.items()},
+    }
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        return 1 if compare(report["results"], baseline, args.tolerance) else 0
+    for name, value in report["results"].items():
+        print(f"{name:<24}  {value:>10.3f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
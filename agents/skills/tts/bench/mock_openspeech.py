@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""Local stand-in for the openspeech async TTS API, for benchmarks and offline runs.
+
+Implements `/api/v3/tts/submit` and `/api/v3/tts/query` with a configurable
+queue delay, failure injection and request quota (429 beyond it), and serves the audio
+from `/audio/<task_id>.<ext>` (placeholder Ogg/PCM bytes when a task asked for
+`ogg_opus` or `pcm`) with Range and If-Range support, under an ETag that changes with
+the bytes; `/stats` returns request counters. Point the scripts at it with
+`VOLC_TTS_BASE_URL=http://127.0.0.1:<port>`.
+"""
+
+import argparse
+import itertools
+import json
+import random
+import re
+import socket
+import sys
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# MPEG-1 Layer III, 128 kbit/s, 44.1 kHz, no padding: 417-byte frames of silence.
+SILENT_FRAME = b"\xff\xfb\x90\x64" + bytes(413)
+_RANGE = re.compile(r"bytes=(\d+)-(\d*)$")
+EXTENSIONS = {"mp3": "mp3", "ogg_opus": "ogg", "pcm": "pcm"}
+
+
+def silent_mp3(size: int) -> bytes:
+    """Whole silent frames adding up to at least `size` bytes."""
+    return SILENT_FRAME * max(1, -(-size // len(SILENT_FRAME)))
+
+
+def etag(audio: bytes) -> str:
+    return f'"{zlib.crc32(audio):08x}-{len(audio)}"'
+
+
+def placeholder(fmt: str, mp3: bytes) -> bytes:
+    """Stand-in audio for `fmt`, sized roughly as that codec compares to 128 kbit/s MP3."""
+    if fmt == "ogg_opus":
+        return b"OggS" + bytes(max(0, len(mp3) // 4 - 4))
+    if fmt == "pcm":
+        return bytes(len(mp3) * 3)
+    return mp3
+
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: tuple[str, int],
+        audio: bytes,
+        queue_delay: float = 1.0,
+        seconds_per_char: float = 0.0,
+        fail_rate: float = 0.0,
+        error_rate: float = 0.0,
+        quota: float = 0.0,
+        seed: int | None = None,
+    ) -> None:
+        super().__init__(address, Handler)
+        self.audio = audio
+        self.audio_by_format = {"mp3": audio}
+        self.queue_delay = queue_delay
+        self.seconds_per_char = seconds_per_char
+        self.fail_rate = fail_rate
+        self.error_rate = error_rate
+        self.quota = quota
+        self.allowance = quota
+        self.allowance_at = time.monotonic()
+        self.random = random.Random(seed)
+        self.counter = itertools.count()
+        self.tasks: dict[str, dict] = {}
+        self.by_unique_id: dict[str, str] = {}
+        self.texts: set[tuple[str, str]] = set()
+        # False plays a server that answers every Range with 206, whatever If-Range says.
+        self.honor_if_range = True
+        self.lock = threading.Lock()
+        self.stats = {
+            "submit": 0,
+            "query": 0,
+            "download": 0,
+            "errors": 0,
+            "throttled": 0,
+            "duplicates": 0,
+            "bytes": 0,
+        }
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def handle_error(self, request, client_address) -> None:
+        # A client that closes a response early (a restarted download) is not an error.
+        if not isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            super().handle_error(request, client_address)
+
+    def replace_audio(self, audio: bytes) -> None:
+        """Serve `audio` (and placeholders derived from it) from now on."""
+        with self.lock:
+            self.audio = audio
+            self.audio_by_format = {"mp3": audio}
+
+    def count(self, name: str, n: int = 1) -> None:
+        with self.lock:
+            self.stats[name] += n
+
+    def over_quota(self) -> bool:
+        """One-second token bucket over all POSTs; True when this one must get a 429."""
+        if self.quota <= 0:
+            return False
+        with self.lock:
+            now = time.monotonic()
+            self.allowance = min(self.quota, self.allowance + (now - self.allowance_at) * self.quota)
+            self.allowance_at = now
+            if self.allowance < 1:
+                return True
+            self.allowance -= 1
+            return False
+
+    def roll(self, rate: float) -> bool:
+        with self.lock:
+            return rate > 0 and self.random.random() < rate
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: MockServer
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+    def setup(self) -> None:
+        super().setup()
+        # Replies are small; don't let Nagle + delayed ACK add 40 ms to each one.
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def _send(self, status: int, body: bytes | memoryview, headers: dict | None = None) -> None:
+        lines = [f"HTTP/1.1 {status} {self.responses[status][0]}", f"Content-Length: {len(body)}"]
+        lines += [f"{k}: {v}" for k, v in (headers or {}).items()]
+        head = ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+        self.log_request(status)
+        if len(body) <= 64 * 1024:
+            self.wfile.write(head + bytes(body))  # one segment for small replies
+        else:
+            self.wfile.write(head)
+            self.wfile.write(body)
+
+    def _json(self, obj: dict, status: int = 200) -> None:
+        self._send(status, json.dumps(obj).encode("utf-8"), {"Content-Type": "application/json"})
+
+    def do_POST(self) -> None:
+        srv = self.server
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if srv.over_quota():
+            srv.count("throttled")
+            self._send(
+                429,
+                json.dumps({"code": 45000000, "message": "quota exceeded"}).encode("utf-8"),
+                {"Content-Type": "application/json", "Retry-After": "1"},
+            )
+            return
+        # Injected errors hit after a submit is registered, like a reply lost on the way back.
+        error = srv.roll(srv.error_rate)
+        if self.path == "/api/v3/tts/submit":
+            srv.count("submit")
+            params = body.get("req_params", {})
+            text = params.get("text", "")
+            fmt = params.get("audio_params", {}).get("format", "mp3")
+            unique_id = body.get("unique_id")
+            with srv.lock:
+                task_id = srv.by_unique_id.get(unique_id)
+                if task_id is None:
+                    task_id = f"mock-{next(srv.counter)}"
+                    ready = time.monotonic() + srv.queue_delay + srv.seconds_per_char * len(text)
+                    failed = srv.random.random() < srv.fail_rate
+                    srv.tasks[task_id] = {"ready": ready, "failed": failed, "format": fmt}
+                    if unique_id:
+                        srv.by_unique_id[unique_id] = task_id
+                    # The same text billed twice, e.g. a retry that minted a new unique_id.
+                    if (text, fmt) in srv.texts:
+                        srv.stats["duplicates"] += 1
+                    srv.texts.add((text, fmt))
+            if error:
+                srv.count("errors")
+                self._json({"code": 55000000, "message": "injected server error"}, 500)
+                return
+            self._json({"code": 20000000, "message": "ok", "data": {"task_id": task_id}})
+        elif error:
+            srv.count("errors")
+            self._json({"code": 55000000, "message": "injected server error"}, 500)
+        elif self.path == "/api/v3/tts/query":
+            srv.count("query")
+            task_id = body.get("task_id", "")
+            task = srv.tasks.get(task_id)
+            if task is None:
+                self._json({"code": 40400000, "message": f"unknown task {task_id}"})
+                return
+            data = {"task_id": task_id, "task_status": 1}
+            if time.monotonic() >= task["ready"]:
+                if task["failed"]:
+                    data.update(task_status=3, message="injected synthesis failure")
+                else:
+                    ext = EXTENSIONS.get(task["format"], "mp3")
+                    data.update(task_status=2, audio_url=f"{srv.base_url}/audio/{task_id}.{ext}")
+            self._json({"code": 20000000, "message": "ok", "data": data})
+        else:
+            self._json({"code": 40400000, "message": "not found"}, 404)
+
+    def do_GET(self) -> None:
+        srv = self.server
+        if self.path == "/stats":
+            with srv.lock:
+                self._json({**srv.stats, "tasks": len(srv.tasks)})
+            return
+        if not self.path.startswith("/audio/"):
+            self._json({"code": 40400000, "message": "not found"}, 404)
+            return
+        ext = self.path.rsplit(".", 1)[-1]
+        fmt = next((f for f, e in EXTENSIONS.items() if e == ext), "mp3")
+        with srv.lock:
+            if fmt not in srv.audio_by_format:
+                srv.audio_by_format[fmt] = placeholder(fmt, srv.audio)
+            audio = srv.audio_by_format[fmt]
+        tag = etag(audio)
+        headers = {
+            "Content-Type": "application/octet-stream",
+            "Accept-Ranges": "bytes",
+            "ETag": tag,
+        }
+        match = _RANGE.match(self.headers.get("Range", ""))
+        if_range = self.headers.get("If-Range")
+        if srv.honor_if_range and if_range is not None and if_range != tag:
+            match = None  # the client's copy is of other bytes: send the whole thing
+        if match:
+            start = int(match.group(1))
+            end = min(int(match.group(2) or len(audio) - 1), len(audio) - 1)
+            if start >= len(audio):
+                self._send(416, b"", {"Content-Range": f"bytes */{len(audio)}"})
+                return
+            headers["Content-Range"] = f"bytes {start}-{end}/{len(audio)}"
+            status, body = 206, memoryview(audio)[start : end + 1]
+        else:
+            status, body = 200, memoryview(audio)
+        srv.count("download")
+        srv.count("bytes", len(body))
+        self._send(status, body, headers)
+
+
+def start(port: int = 0, audio: bytes | None = None, **options) -> MockServer:
+    """Run a mock server on a background thread; `server.base_url` is where it listens."""
+    server = MockServer(("127.0.0.1", port), audio or silent_mp3(64 * 1024), **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765, help="Port to listen on (0: any free port).")
+    parser.add_argument(
+        "--queue-delay", type=float, default=1.0, help="Seconds before a task is done (default: 1)."
+    )
+    parser.add_argument(
+        "--seconds-per-char", type=float, default=0.0, help="Extra delay per submitted character."
+    )
+    parser.add_argument(
+        "--fail-rate", type=float, default=0.0, help="Fraction of tasks that end in task_status 3."
+    )
+    parser.add_argument(
+        "--error-rate",
+        type=float,
+        default=0.0,
+        help="Fraction of POSTs answered with HTTP 500 (a submit still creates its task).",
+    )
+    audio_g = parser.add_mutually_exclusive_group()
+    audio_g.add_argument("--audio", help="File served as every task's audio.")
+    audio_g.add_argument(
+        "--audio-kb", type=int, default=64, help="Size of the generated silent MP3 (default: 64)."
+    )
+    parser.add_argument(
+        "--quota", type=float, default=0.0, help="POSTs per second before answering 429 (0: no limit)."
+    )
+    parser.add_argument("--seed", type=int, default=None, help="Seed for failure injection.")
+    args = parser.parse_args()
+
+    if args.audio:
+        with open(args.audio, "rb") as f:
+            audio = f.read()
+    else:
+        audio = silent_mp3(args.audio_kb * 1024)
+    server = MockServer(
+        ("127.0.0.1", args.port),
+        audio,
+        queue_delay=args.queue_delay,
+        seconds_per_char=args.seconds_per_char,
+        fail_rate=args.fail_rate,
+        error_rate=args.error_rate,
+        quota=args.quota,
+        seed=args.seed,
+    )
+    print(f"VOLC_TTS_BASE_URL={server.base_url}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
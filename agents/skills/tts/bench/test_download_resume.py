@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""Resuming a `.part` after the server's audio changed must not splice old and new bytes.
+
+Runs tts_query.download_audio against the mock server:
+
+    python -m unittest test_download_resume.py
+"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "scripts"))
+
+import mock_openspeech  # noqa: E402
+
+OLD = mock_openspeech.silent_mp3(32 * 1024)
+NEW = b"\xff\xfb\x90\x44" + bytes(len(OLD) + 1000)
+
+
+class ResumeAfterChange(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.workdir = tempfile.mkdtemp(prefix="tts-resume-")
+        cls.server = mock_openspeech.start(audio=OLD, queue_delay=0.0)
+        # tts_query reads these at import time.
+        os.environ.update(
+            VOLC_APP_ID="test",
+            VOLC_ACCESS_KEY="test",
+            VOLC_TTS_BASE_URL=cls.server.base_url,
+            TTS_CACHE_DIR=os.path.join(cls.workdir, "cache"),
+            TTS_JOURNAL=os.path.join(cls.workdir, "journal.sqlite3"),
+            TTS_RATE_LIMIT="0",
+            XDG_RUNTIME_DIR=cls.workdir,
+        )
+        global tts_query
+        import tts_query
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.shutdown()
+        cls.server.server_close()
+        shutil.rmtree(cls.workdir, ignore_errors=True)
+
+    def setUp(self) -> None:
+        self.server.replace_audio(OLD)
+        self.server.honor_if_range = True
+        self.output = os.path.join(tempfile.mkdtemp(dir=self.workdir), "out.mp3")
+        self.url = f"{self.server.base_url}/audio/task.mp3"
+
+    def interrupt(self) -> None:
+        """Leave the first half of OLD in `.part`, as a download cut off midway would."""
+        tts_query.download_audio(self.url, self.output)
+        with open(self.output, "rb") as f:
+            head = f.read(len(OLD) // 2)
+        os.remove(self.output)
+        with open(f"{self.output}.part", "wb") as f:
+            f.write(head)
+        with open(f"{self.output}.part.json", "w", encoding="utf-8") as f:
+            json.dump({"etag": mock_openspeech.etag(OLD), "last_modified": None}, f)
+
+    def resume(self) -> bytes:
+        tts_query.download_audio(self.url, self.output)
+        self.assertFalse(os.path.exists(f"{self.output}.part"))
+        with open(self.output, "rb") as f:
+            return f.read()
+
+    def test_unchanged_audio_resumes(self) -> None:
+        self.interrupt()
+        self.assertEqual(self.resume(), OLD)
+
+    def test_changed_audio_restarts(self) -> None:
+        self.interrupt()
+        self.server.replace_audio(NEW)
+        self.assertEqual(self.resume(), NEW)
+
+    def test_changed_audio_restarts_when_if_range_is_ignored(self) -> None:
+        self.interrupt()
+        self.server.replace_audio(NEW)
+        self.server.honor_if_range = False
+        self.assertEqual(self.resume(), NEW)
+
+
+if __name__ == "__main__":
+    unittest.main()
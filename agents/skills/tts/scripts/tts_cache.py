@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""Content-addressed local cache of synthesized audio, with LRU size cap.
+
+Entries are keyed by a hash of the cleaned text, speaker and audio params, so
+re-running the skill on an unchanged note costs no network at all. A cache
+hit is handed to `tts_query.py` as the pseudo task id `cache:<key>`.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+
+from tts_common import env_number
+
+CACHED_PREFIX = "cache:"
+DEFAULT_MAX_BYTES = 2 * 1024**3
+
+
+def cache_dir() -> str:
+    env = os.environ.get("TTS_CACHE_DIR")
+    if env:
+        return os.path.expanduser(env)
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "tts")
+
+
+def max_bytes() -> int:
+    return env_number("TTS_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES, integer=True)
+
+
+def cache_key(text: str, speaker: str, audio_params: dict) -> str:
+    blob = json.dumps([text, speaker, audio_params], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def _object_path(key: str) -> str:
+    # No extension: the key already covers the audio format.
+    return os.path.join(cache_dir(), "objects", key)
+
+
+def lookup(key: str) -> str | None:
+    """Return the cached file for `key` and mark it most recently used, or None."""
+    path = _object_path(key)
+    try:
+        os.utime(path)
+    except OSError:
+        return None
+    return path
+
+
+def fetch(key: str, output_path: str) -> bool:
+    """Copy the cached audio for `key` to `output_path`; False on a miss."""
+    path = lookup(key)
+    if path is None:
+        return False
+    parent = os.path.dirname(output_path)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+    try:
+        shutil.copyfile(path, output_path)
+    except FileNotFoundError:  # evicted between lookup and copy
+        return False
+    return True
+
+
+def store(key: str, src_path: str) -> None:
+    """Atomically add `src_path` under `key`, then evict down to the size cap."""
+    path = _object_path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    shutil.copyfile(src_path, tmp_path)
+    os.replace(tmp_path, path)
+    prune(max_bytes())
+
+
+def entries() -> list[dict]:
+    """Cached objects, most recently used first."""
+    root = os.path.join(cache_dir(), "objects")
+    found = []
+    try:
+        names = os.listdir(root)
+    except OSError:
+        return []
+    for key in names:
+        if len(key) != 64 or "." in key:  # skips in-progress .tmp files
+            continue
+        path = os.path.join(root, key)
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        found.append({"key": key, "bytes": st.st_size, "used": st.st_mtime, "path": path})
+    found.sort(key=lambda e: e["used"], reverse=True)
+    return found
+
+
+def prune(limit: int, older_than: float | None = None) -> list[dict]:
+    """Evict least recently used entries until the total fits `limit` bytes.
+
+    With `older_than` (seconds), also evict anything unused for that long.
+    """
+    removed = []
+    total = 0
+    cutoff = time.time() - older_than if older_than is not None else None
+    for entry in entries():
+        if total + entry["bytes"] <= limit and (cutoff is None or entry["used"] >= cutoff):
+            total += entry["bytes"]
+            continue
+        try:
+            os.remove(entry["path"])
+        except OSError:
+            continue
+        removed.append(entry)
+    return removed
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="List or prune the local TTS audio cache.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="Print one JSON line per cached entry, most recent first.")
+    prune_p = sub.add_parser("prune", help="Evict least recently used entries.")
+    prune_p.add_argument(
+        "--max-bytes", type=int, default=None, help="Size cap (default: TTS_CACHE_MAX_BYTES or 2 GiB)."
+    )
+    prune_p.add_argument(
+        "--older-than-days", type=float, default=None, help="Also evict entries unused this long."
+    )
+    args = parser.parse_args()
+
+    if args.command == "list":
+        total = 0
+        for entry in entries():
+            total += entry["bytes"]
+            print(json.dumps(entry))
+        print(f"{total} bytes in {cache_dir()}", file=sys.stderr)
+        return 0
+
+    try:
+        limit = args.max_bytes if args.max_bytes is not None else max_bytes()
+    except ValueError as exc:
+        print(f"Invalid cache settings: {exc}", file=sys.stderr)
+        return 1
+    older = args.older_than_days * 86400 if args.older_than_days is not None else None
+    removed = prune(limit, older)
+    freed = sum(e["bytes"] for e in removed)
+    print(f"Evicted {len(removed)} entries ({freed} bytes)", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,62 @@
+"""Pieces the TTS scripts share that need no configuration at import time.
+
+tts_submit.py validates its credentials and audio settings as soon as it is
+imported; whatever the other scripts take from it lives here instead, so that
+querying or downloading never trips over a setting it does not use. Importing
+this module is cheap: requests is only loaded by make_session().
+"""
+
+import math
+import os
+import sys
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import requests
+
+# Codecs the async API can return, and the file extension each is saved under.
+AUDIO_FORMATS = {"mp3": ".mp3", "ogg_opus": ".ogg", "pcm": ".pcm"}
+
+
+def env_number(name: str, default: float, integer: bool = False) -> float:
+    """A non-negative number (a whole one with `integer`) from the environment, or
+    `default` when unset or empty; a bad value raises ValueError naming the variable."""
+    raw = os.environ.get(name, "").strip()
+    if not raw:
+        return default
+    kind = "whole number" if integer else "number"
+    try:
+        value = int(raw) if integer else float(raw)
+    except ValueError:
+        raise ValueError(f"{name} must be a {kind}, not {raw!r}") from None
+    if not math.isfinite(value) or value < 0:
+        raise ValueError(f"{name} must be a finite {kind} >= 0, not {raw!r}")
+    return value
+
+
+def check_settings() -> None:
+    """Parse the numeric TTS_* settings up front, so a bad value stops a script before it
+    starts any work instead of failing inside it; prints the problem and exits 1."""
+    import tts_cache
+    import tts_ratelimit
+    import tts_retry
+
+    try:
+        tts_ratelimit.burst()  # reads TTS_RATE_LIMIT as well
+        tts_retry.threshold()
+        tts_retry.cooldown()
+        tts_cache.max_bytes()
+    except ValueError as exc:
+        print(f"Invalid settings: {exc}", file=sys.stderr)
+        sys.exit(1)
+
+
+def make_session(pool_size: int = 10) -> "requests.Session":
+    """Keep-alive session whose connection pool fits `pool_size` worker threads."""
+    import requests
+
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
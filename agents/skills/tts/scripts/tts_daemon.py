@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""Long-lived TTS worker on a Unix socket, and the thin client that talks to it.
+
+The daemon keeps a warm keep-alive session to the TTS endpoint (no per-call
+interpreter start, `requests` import or TLS handshake) and the state of the
+jobs it is running in memory. Client commands import only the standard
+library and start the daemon on first use; it exits after sitting idle.
+
+The endpoint, credentials, speaker and audio settings are read once, when
+the daemon starts, so each combination of them gets its own daemon and socket;
+`ping` reports the daemon's, and a client refuses one that does not match.
+
+Protocol: one JSON request line per connection, answered by one JSON line.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Mapping
+
+from tts_common import AUDIO_FORMATS
+
+DEFAULT_IDLE_TIMEOUT = 1800.0
+SPAWN_WAIT = 10.0
+# What the daemon's scripts read from the environment at import time.
+CONFIG_VARS = (
+    "VOLC_TTS_BASE_URL",
+    "VOLC_APP_ID",
+    "VOLC_ACCESS_KEY",
+    "VOLC_SPEAKER",
+    "VOLC_AUDIO_FORMAT",
+    "VOLC_SAMPLE_RATE",
+    "VOLC_BIT_RATE",
+)
+
+
+def config_fingerprint(env: Mapping[str, str] | None = None) -> str:
+    """Short hash of the CONFIG_VARS in `env` (default: this process's environment)."""
+    env = os.environ if env is None else env
+    blob = json.dumps([env.get(name, "") for name in CONFIG_VARS])
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()[:16]
+
+
+def socket_path(env: Mapping[str, str] | None = None) -> str:
+    env = os.environ if env is None else env
+    explicit = env.get("TTS_DAEMON_SOCKET")
+    if explicit:
+        return os.path.expanduser(explicit)
+    runtime = env.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    return os.path.join(runtime, f"tts-{os.getuid()}-{config_fingerprint(env)}.sock")
+
+
+def call(request: dict, path: str | None = None, timeout: float | None = None) -> dict:
+    """Send one request to the daemon and return its reply; raises OSError if it is not running."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(path or socket_path())
+        sock.sendall(json.dumps(request, ensure_ascii=False).encode("utf-8") + b"\n")
+        with sock.makefile("rb") as f:
+            line = f.readline()
+    if not line:
+        raise ConnectionError("TTS daemon closed the connection without replying")
+    return json.loads(line)
+
+
+def _check_config(reply: dict, fingerprint: str, path: str) -> None:
+    if reply.get("config") != fingerprint:
+        raise ConnectionError(
+            f"TTS daemon on {path} was started with other endpoint, credential, speaker or "
+            f"audio settings; stop it with `tts_daemon.py --socket {path} stop`"
+        )
+
+
+def ensure_daemon(path: str | None = None, env: Mapping[str, str] | None = None) -> None:
+    """Start a daemon with the settings in `env` unless one already answers on the socket.
+
+    Raises ConnectionError if the daemon there runs with other settings.
+    """
+    env = dict(os.environ if env is None else env)
+    path = path or socket_path(env)
+    fingerprint = config_fingerprint(env)
+    try:
+        reply = call({"op": "ping"}, path, timeout=2)
+    except OSError:
+        pass
+    else:
+        _check_config(reply, fingerprint, path)
+        return
+    log_dir = os.path.join(
+        os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"), "tts"
+    )
+    os.makedirs(log_dir, exist_ok=True)
+    with open(os.path.join(log_dir, "daemon.log"), "ab") as log:
+        subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "--socket", path, "serve"],
+            stdin=subprocess.DEVNULL,
+            stdout=log,
+            stderr=log,
+            env=env,
+            start_new_session=True,
+        )
+    deadline = time.monotonic() + SPAWN_WAIT
+    while time.monotonic() < deadline:
+        try:
+            reply = call({"op": "ping"}, path, timeout=2)
+        except OSError:
+            time.sleep(0.05)
+            continue
+        _check_config(reply, fingerprint, path)
+        return
+    raise ConnectionError(f"TTS daemon did not come up on {path}; see {log_dir}/daemon.log")
+
+
+def serve(path: str, idle_timeout: float) -> int:
+    """Run the daemon until idle for `idle_timeout` seconds or told to shut down."""
+    import socketserver
+
+    import requests
+
+    import tts_cache
+    import tts_journal
+    import tts_metrics
+    import tts_query
+    import tts_submit
+
+    config = config_fingerprint()
+    session = tts_submit.make_session(32)
+    jobs: dict[str, dict] = {}
+    jobs_lock = threading.Lock()
+    last_active = [time.monotonic()]
+
+    def track(task_id: str, **fields) -> None:
+        with jobs_lock:
+            jobs.setdefault(task_id, {"task_id": task_id}).update(fields, updated=time.time())
+
+    def op_submit(req: dict) -> dict:
+        use_cache = req.get("cache", True)
+        if "file" in req:
+            record = tts_submit.submit_file(req["file"], session, use_cache)
+        else:
+            text = req["text"]
+            task_id = tts_submit.cached_task_id(text) if use_cache else None
+            if task_id:
+                record = {"task_id": task_id, "chars": len(text), "cached": True}
+            else:
+                resp = tts_submit.submit_or_reattach(text, session, reattach=use_cache)
+                if resp.get("code") != 20000000:
+                    error = f"submit failed with code {resp.get('code')}"
+                    return {"error": error, "submit_response": resp}
+                record = {"task_id": resp["data"]["task_id"], "chars": len(text)}
+        if "task_id" in record:
+            track(record["task_id"], status="submitted", chars=record.get("chars"))
+        return record
+
+    def op_query(req: dict) -> dict:
+        audio_url, data, _ = tts_query.poll_once(req["task_id"], session)
+        track(req["task_id"], status=data.get("task_status"))
+        status = data.get("task_status")
+        return {"task_id": req["task_id"], "task_status": status, "audio_url": audio_url}
+
+    def op_download(req: dict) -> dict:
+        task_id, output = req["task_id"], req["output"]
+        if task_id.startswith(tts_cache.CACHED_PREFIX):
+            if not tts_query.fetch_cached(task_id, output):
+                return {"task_id": task_id, "error": "cache entry is gone; resubmit the file"}
+            return {"task_id": task_id, "output": output, "cached": True}
+        tts_journal.set_output(task_id, output)
+        track(task_id, status="polling", output=output)
+        span = tts_metrics.Span("tts_daemon", task_id=task_id)
+
+        def on_poll(n: int, status: object) -> None:
+            if status == 2:
+                track(task_id, status="downloading")
+
+        try:
+            tts_query.await_audio(
+                task_id,
+                output,
+                session,
+                chars=req.get("chars"),
+                timeout=req.get("timeout", tts_query.DEFAULT_TIMEOUT),
+                use_cache=req.get("cache", True),
+                span=span,
+                on_poll=on_poll,
+            )
+        except (tts_query.TaskFailed, OSError, requests.RequestException) as exc:
+            span.finish("failed", error=str(exc))
+            raise
+        span.finish("done")
+        track(task_id, status="done")
+        return {"task_id": task_id, "output": output}
+
+    def op_jobs(req: dict) -> dict:
+        with jobs_lock:
+            return {"jobs": list(jobs.values())}
+
+    handlers = {
+        "ping": lambda req: {"ok": True, "pid": os.getpid(), "config": config},
+        "submit": op_submit,
+        "query": op_query,
+        "download": op_download,
+        "jobs": op_jobs,
+    }
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self) -> None:
+            last_active[0] = time.monotonic()
+            line = self.rfile.readline()
+            try:
+                req = json.loads(line)
+                op = req.get("op")
+                if op == "shutdown":
+                    reply = {"ok": True}
+                    threading.Thread(target=server.shutdown, daemon=True).start()
+                elif op in handlers:
+                    reply = handlers[op](req)
+                else:
+                    reply = {"error": f"unknown op: {op}"}
+            except tts_query.TaskFailed as exc:
+                if exc.result is not None:
+                    tts_journal.mark_failed(req["task_id"], str(exc))
+                track(req["task_id"], status="failed", error=str(exc))
+                reply = {"task_id": req["task_id"], "error": str(exc), "result": exc.result}
+            except (ValueError, KeyError, OSError, requests.RequestException) as exc:
+                reply = {"error": f"{type(exc).__name__}: {exc}"}
+            last_active[0] = time.monotonic()
+            try:
+                self.wfile.write(json.dumps(reply, ensure_ascii=False).encode("utf-8") + b"\n")
+            except OSError:
+                pass  # client went away
+
+    class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+    if os.path.exists(path):
+        try:
+            call({"op": "ping"}, path, timeout=2)
+            print(f"TTS daemon already running on {path}", file=sys.stderr)
+            return 1
+        except OSError:
+            os.unlink(path)  # stale socket from a crashed daemon
+    old_umask = os.umask(0o077)
+    try:
+        server = Server(path, Handler)
+    finally:
+        os.umask(old_umask)
+
+    def idle_watch() -> None:
+        while True:
+            time.sleep(min(30.0, idle_timeout))
+            with jobs_lock:
+                busy = any(j.get("status") in ("polling", "downloading") for j in jobs.values())
+            if not busy and time.monotonic() - last_active[0] > idle_timeout:
+                server.shutdown()
+                return
+
+    threading.Thread(target=idle_watch, daemon=True).start()
+    print(f"TTS daemon {os.getpid()} listening on {path}", file=sys.stderr, flush=True)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+        session.close()
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="TTS worker daemon on a Unix socket, with thin client commands."
+    )
+    parser.add_argument(
+        "--socket",
+        default=None,
+        help="Socket path (default: TTS_DAEMON_SOCKET or $XDG_RUNTIME_DIR/tts-<uid>-<config>.sock, "
+        "one per endpoint, credentials, speaker and audio settings).",
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+    serve_p = sub.add_parser("serve", help="Run the daemon in the foreground.")
+    serve_p.add_argument(
+        "--idle-timeout",
+        type=float,
+        default=DEFAULT_IDLE_TIMEOUT,
+        help=f"Exit after this many idle seconds (default: {DEFAULT_IDLE_TIMEOUT:.0f}).",
+    )
+    submit_p = sub.add_parser("submit", help="Submit Markdown file(s); one JSON line per file.")
+    submit_p.add_argument("files", nargs="+")
+    submit_p.add_argument("--no-cache", action="store_true")
+    submit_p.add_argument(
+        "--format", choices=list(AUDIO_FORMATS), help="Audio codec (sets VOLC_AUDIO_FORMAT)."
+    )
+    submit_p.add_argument("--sample-rate", type=int, help="Sample rate (sets VOLC_SAMPLE_RATE).")
+    submit_p.add_argument(
+        "--bit-rate", type=int, metavar="BPS", help="Bitrate (sets VOLC_BIT_RATE)."
+    )
+    query_p = sub.add_parser("query", help="Wait for a task and download its audio.")
+    query_p.add_argument("task_id")
+    query_p.add_argument("output")
+    query_p.add_argument("--chars", type=int, default=None)
+    query_p.add_argument("--no-cache", action="store_true")
+    sub.add_parser("jobs", help="Print the daemon's in-memory job table.")
+    sub.add_parser("stop", help="Shut the daemon down.")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    if args.command == "submit":
+        # The daemon takes its audio settings from its environment, as tts_submit.py does.
+        for name, value in (
+            ("VOLC_AUDIO_FORMAT", args.format),
+            ("VOLC_SAMPLE_RATE", args.sample_rate),
+            ("VOLC_BIT_RATE", args.bit_rate),
+        ):
+            if value is not None:
+                env[name] = str(value)
+    path = args.socket or socket_path(env)
+    if args.command == "serve":
+        return serve(path, args.idle_timeout)
+    if args.command == "stop":
+        try:
+            call({"op": "shutdown"}, path, timeout=5)
+        except OSError:
+            print("TTS daemon is not running.", file=sys.stderr)
+        return 0
+
+    try:
+        ensure_daemon(path, env)
+    except OSError as exc:
+        print(exc, file=sys.stderr)
+        return 1
+    if args.command == "jobs":
+        for job in call({"op": "jobs"}, path)["jobs"]:
+            print(json.dumps(job, ensure_ascii=False))
+        return 0
+    if args.command == "submit":
+        failed = 0
+        for file in args.files:
+            request = {"op": "submit", "file": os.path.abspath(file), "cache": not args.no_cache}
+            reply = call(request, path)
+            failed += "error" in reply
+            print(json.dumps(reply, ensure_ascii=False), flush=True)
+        return 1 if failed else 0
+
+    reply = call(
+        {
+            "op": "download",
+            "task_id": args.task_id,
+            "output": os.path.abspath(args.output),
+            "chars": args.chars,
+            "cache": not args.no_cache,
+        },
+        path,
+    )
+    if "error" in reply:
+        print(json.dumps(reply, ensure_ascii=False, indent=2), file=sys.stderr)
+        return 1
+    print(args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
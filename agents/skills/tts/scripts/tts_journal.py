@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""Crash-safe journal of submitted TTS tasks, shared by the submit and query scripts.
+
+Every submission is recorded (text hash, task_id, timestamps, status) in a
+local SQLite database, so a restarted agent can resume unfinished downloads
+with `tts_query.py --resume` and a re-run batch reattaches to in-flight tasks
+instead of paying for them twice.
+"""
+
+import argparse
+import fcntl
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+# Server-side results are not kept forever; older in-flight tasks are not reattached.
+TASK_TTL = 12 * 3600
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    task_id      TEXT PRIMARY KEY,
+    text_hash    TEXT NOT NULL,
+    chars        INTEGER,
+    source       TEXT,
+    format       TEXT,
+    output       TEXT,
+    status       TEXT NOT NULL,
+    error        TEXT,
+    submitted_at REAL NOT NULL,
+    updated_at   REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tasks_by_hash ON tasks (text_hash, status);
+"""
+
+_lock = threading.Lock()
+_conn: sqlite3.Connection | None = None
+
+
+def journal_path() -> str:
+    env = os.environ.get("TTS_JOURNAL")
+    if env:
+        return os.path.expanduser(env)
+    base = os.environ.get("XDG_STATE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".local", "state"
+    )
+    return os.path.join(base, "tts", "journal.sqlite3")
+
+
+def _db() -> sqlite3.Connection:
+    global _conn
+    if _conn is None:
+        path = journal_path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = sqlite3.connect(path, timeout=10, isolation_level=None, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        # WAL keeps readers and writers from several agents out of each other's way;
+        # every statement autocommits, so a crash loses at most the one in flight.
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        _conn = conn
+    return _conn
+
+
+@contextmanager
+def flight(name: str) -> Iterator[bool]:
+    """Hold the cross-process lock `name` (e.g. one synthesis or one task) for the block.
+
+    Yields True if another process or thread held it first and this caller had to wait,
+    i.e. the work it guards may already be done.
+    """
+    lock_dir = os.path.join(os.path.dirname(journal_path()), "locks")
+    os.makedirs(lock_dir, exist_ok=True)
+    fd = os.open(os.path.join(lock_dir, f"{name}.lock"), os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            waited = False
+        except BlockingIOError:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            waited = True
+        yield waited
+    finally:
+        os.close(fd)
+
+
+def _execute(sql: str, params: tuple = ()) -> list[dict]:
+    with _lock:
+        return [dict(row) for row in _db().execute(sql, params).fetchall()]
+
+
+def record_submit(
+    task_id: str,
+    text_hash: str,
+    chars: int,
+    source: str | None = None,
+    fmt: str | None = None,
+) -> None:
+    now = time.time()
+    _execute(
+        "INSERT OR REPLACE INTO tasks "
+        "(task_id, text_hash, chars, source, format, status, submitted_at, updated_at) "
+        "VALUES (?, ?, ?, ?, ?, 'submitted', ?, ?)",
+        (task_id, text_hash, chars, source, fmt, now, now),
+    )
+
+
+def find_inflight(text_hash: str) -> dict | None:
+    """Most recent unfinished task for this exact synthesis, if still young enough to reattach."""
+    rows = _execute(
+        "SELECT * FROM tasks WHERE text_hash = ? AND status = 'submitted' AND submitted_at > ? "
+        "ORDER BY submitted_at DESC LIMIT 1",
+        (text_hash, time.time() - TASK_TTL),
+    )
+    return rows[0] if rows else None
+
+
+def lookup(task_id: str) -> dict | None:
+    rows = _execute("SELECT * FROM tasks WHERE task_id = ?", (task_id,))
+    return rows[0] if rows else None
+
+
+def set_output(task_id: str, output: str) -> None:
+    """Remember where a task's audio goes, so --resume can finish it after a crash."""
+    _execute(
+        "UPDATE tasks SET output = ?, updated_at = ? WHERE task_id = ?",
+        (os.path.abspath(output), time.time(), task_id),
+    )
+
+
+def mark_done(task_id: str, output: str | None = None) -> None:
+    _execute(
+        "UPDATE tasks SET status = 'done', output = COALESCE(?, output), error = NULL, "
+        "updated_at = ? WHERE task_id = ?",
+        (os.path.abspath(output) if output else None, time.time(), task_id),
+    )
+
+
+def mark_failed(task_id: str, error: str) -> None:
+    _execute(
+        "UPDATE tasks SET status = 'failed', error = ?, updated_at = ? WHERE task_id = ?",
+        (error, time.time(), task_id),
+    )
+
+
+def unfinished() -> list[dict]:
+    """Submitted tasks that were never downloaded and are young enough to resume."""
+    return _execute(
+        "SELECT * FROM tasks WHERE status = 'submitted' AND submitted_at > ? ORDER BY submitted_at",
+        (time.time() - TASK_TTL,),
+    )
+
+
+def prune(older_than: float) -> int:
+    """Forget tasks last updated more than `older_than` seconds ago, and their stale lock files."""
+    cutoff = time.time() - older_than
+    lock_dir = os.path.join(os.path.dirname(journal_path()), "locks")
+    try:
+        names = os.listdir(lock_dir)
+    except OSError:
+        names = []
+    for name in names:
+        path = os.path.join(lock_dir, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            pass
+    with _lock:
+        cur = _db().execute("DELETE FROM tasks WHERE updated_at < ?", (cutoff,))
+        return cur.rowcount
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Inspect or prune the TTS task journal.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    list_p = sub.add_parser("list", help="Print one JSON line per unfinished task.")
+    list_p.add_argument("--all", action="store_true", help="Include done and failed tasks.")
+    prune_p = sub.add_parser("prune", help="Forget old tasks.")
+    prune_p.add_argument(
+        "--older-than-days", type=float, default=30, help="Age cutoff (default: 30)."
+    )
+    args = parser.parse_args()
+
+    if args.command == "list":
+        rows = _execute("SELECT * FROM tasks ORDER BY submitted_at") if args.all else unfinished()
+        for row in rows:
+            print(json.dumps(row, ensure_ascii=False))
+        return 0
+
+    removed = prune(args.older_than_days * 86400)
+    print(f"Forgot {removed} tasks", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
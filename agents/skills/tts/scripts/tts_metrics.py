@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""Per-phase timing spans for TTS jobs, exported as JSON lines and Prometheus metrics.
+
+Off unless configured through the environment:
+
+    TTS_METRICS           append one JSON line per finished job to this file (`-`: stderr)
+    TTS_METRICS_TEXTFILE  keep cumulative histograms in this `.prom` file for the
+                          node_exporter textfile collector (p50/p95 via histogram_quantile)
+"""
+
+import argparse
+import fcntl
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+# Upper bounds in seconds; wide enough for a long document's time to audio.
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+_write_lock = threading.Lock()
+
+
+def enabled() -> bool:
+    return bool(os.environ.get("TTS_METRICS") or os.environ.get("TTS_METRICS_TEXTFILE"))
+
+
+class Span:
+    """Timings and counters of one job: phases are summed seconds, polls and bytes are counts.
+
+    Phases used by the scripts: clean, submit, queue, synthesis, wait (submit-to-done as
+    seen by polling), download, stitch, and time_to_audio (journaled submit to audio on disk).
+    """
+
+    def __init__(self, script: str, **fields) -> None:
+        self.script = script
+        self.fields = {k: v for k, v in fields.items() if v is not None}
+        self.phases: dict[str, float] = {}
+        self.polls = 0
+        self.bytes = 0
+        self._poll_start: float | None = None
+        self._running_at: float | None = None
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def add(self, name: str, seconds: float) -> None:
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def poll(self, data: dict) -> None:
+        """Count one query; split the wait into queue and synthesis once progress shows up."""
+        now = time.monotonic()
+        if self._poll_start is None:
+            self._poll_start = now
+        self.polls += 1
+        progress = data.get("progress")
+        if self._running_at is None and isinstance(progress, (int, float)) and progress > 0:
+            self._running_at = now
+        if data.get("task_status") == 2:
+            self.add("wait", now - self._poll_start)
+            if self._running_at is not None:
+                self.add("queue", self._running_at - self._poll_start)
+                self.add("synthesis", now - self._running_at)
+
+    def finish(self, status: str = "done", **fields) -> None:
+        """Export the span; `status` is e.g. done, cached, failed."""
+        self.fields.update({k: v for k, v in fields.items() if v is not None})
+        if enabled():
+            emit(self.record(status))
+
+    def record(self, status: str) -> dict:
+        record = {"ts": round(time.time(), 3), "script": self.script, "status": status}
+        record.update(self.fields)
+        record["phases"] = {name: round(sec, 4) for name, sec in self.phases.items()}
+        record["polls"] = self.polls
+        record["bytes"] = self.bytes
+        return record
+
+
+def emit(record: dict) -> None:
+    line = json.dumps(record, ensure_ascii=False)
+    path = os.environ.get("TTS_METRICS")
+    with _write_lock:
+        if path == "-":
+            sys.stderr.write(line + "\n")
+            sys.stderr.flush()
+        elif path:
+            path = os.path.expanduser(path)
+            parent = os.path.dirname(path)
+            if parent:
+                os.makedirs(parent, exist_ok=True)
+            # One O_APPEND write per line keeps concurrent processes from interleaving.
+            fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, (line + "\n").encode("utf-8"))
+            finally:
+                os.close(fd)
+        textfile = os.environ.get("TTS_METRICS_TEXTFILE")
+        if textfile:
+            update_textfile(os.path.expanduser(textfile), record)
+
+
+def _empty_histogram() -> dict:
+    return {"buckets": [0] * len(BUCKETS), "sum": 0.0, "count": 0}
+
+
+def _observe(hist: dict, value: float) -> None:
+    for i, bound in enumerate(BUCKETS):
+        if value <= bound:
+            hist["buckets"][i] += 1
+    hist["sum"] += value
+    hist["count"] += 1
+
+
+def update_textfile(path: str, record: dict) -> None:
+    """Fold one record into the cumulative state beside `path` and rewrite the `.prom` file.
+
+    The state (`<path>.state.json`) is shared by every process under a file lock, so
+    counters keep growing across runs as Prometheus expects.
+    """
+    parent = os.path.dirname(path)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+    state_path = f"{path}.state.json"
+    with open(f"{path}.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            with open(state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            state = {}
+        script = record["script"]
+        jobs = state.setdefault("jobs", {})
+        job_key = f"{script}|{record['status']}"
+        jobs[job_key] = jobs.get(job_key, 0) + 1
+        totals = state.setdefault("totals", {})
+        for name in ("polls", "bytes"):
+            key = f"{script}|{name}"
+            totals[key] = totals.get(key, 0) + record.get(name, 0)
+        hists = state.setdefault("phases", {})
+        for phase, seconds in record["phases"].items():
+            _observe(hists.setdefault(f"{script}|{phase}", _empty_histogram()), seconds)
+        _write_atomic(state_path, json.dumps(state))
+        _write_atomic(path, render(state))
+
+
+def _write_atomic(path: str, text: str) -> None:
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def render(state: dict) -> str:
+    """Prometheus text exposition of the cumulative state."""
+    lines = [
+        "# HELP tts_jobs_total TTS jobs finished, by script and status.",
+        "# TYPE tts_jobs_total counter",
+    ]
+    for key, value in sorted(state.get("jobs", {}).items()):
+        script, status = key.split("|")
+        lines.append(f'tts_jobs_total{{script="{script}",status="{status}"}} {value}')
+    names = {"polls": "tts_polls_total", "bytes": "tts_download_bytes_total"}
+    helps = {"polls": "Task status queries sent.", "bytes": "Audio bytes downloaded."}
+    for name, metric in names.items():
+        lines += [f"# HELP {metric} {helps[name]}", f"# TYPE {metric} counter"]
+        for key, value in sorted(state.get("totals", {}).items()):
+            script, total = key.split("|")
+            if total == name:
+                lines.append(f'{metric}{{script="{script}"}} {value}')
+    lines += [
+        "# HELP tts_phase_seconds Time spent in each phase of a TTS job.",
+        "# TYPE tts_phase_seconds histogram",
+    ]
+    for key, hist in sorted(state.get("phases", {}).items()):
+        script, phase = key.split("|")
+        labels = f'script="{script}",phase="{phase}"'
+        for bound, count in zip(BUCKETS, hist["buckets"]):
+            lines.append(f'tts_phase_seconds_bucket{{{labels},le="{bound}"}} {count}')
+        lines.append(f'tts_phase_seconds_bucket{{{labels},le="+Inf"}} {hist["count"]}')
+        lines.append(f"tts_phase_seconds_sum{{{labels}}} {hist['sum']:.6f}")
+        lines.append(f"tts_phase_seconds_count{{{labels}}} {hist['count']}")
+    return "\n".join(lines) + "\n"
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Summarize TTS timing spans from a JSON-lines log.")
+    parser.add_argument(
+        "log", nargs="?", default=os.environ.get("TTS_METRICS"), help="Span log (default: TTS_METRICS)."
+    )
+    parser.add_argument("--script", default=None, help="Only spans from this script.")
+    args = parser.parse_args()
+    if not args.log or args.log == "-":
+        parser.error("no span log given and TTS_METRICS is not a file")
+
+    samples: dict[str, list[float]] = {}
+    with open(os.path.expanduser(args.log), "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if args.script and record.get("script") != args.script:
+                continue
+            for phase, seconds in record.get("phases", {}).items():
+                samples.setdefault(phase, []).append(seconds)
+
+    print(f"{'phase':<14}  {'n':>6}  {'p50 s':>9}  {'p95 s':>9}  {'max s':>9}")
+    for phase, values in sorted(samples.items()):
+        values.sort()
+        p50 = values[(len(values) - 1) // 2]
+        p95 = values[min(len(values) - 1, round(0.95 * (len(values) - 1)))]
+        print(f"{phase:<14}  {len(values):>6}  {p50:>9.3f}  {p95:>9.3f}  {values[-1]:>9.3f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,14 +2,29 @@
 """Query a TTS task and download the resulting audio."""
 
 import argparse
+import heapq
 import json
 import os
+import random
+import shutil
+import statistics
 import sys
+import threading
 import time
 import uuid
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import nullcontext
+from typing import BinaryIO, Callable
 
 import requests
 
+import tts_cache
+import tts_journal
+import tts_metrics
+import tts_ratelimit
+import tts_retry
+from tts_common import AUDIO_FORMATS, check_settings, make_session
+
 
 def _env(key: str) -> str:
     value = os.environ.get(key)
@@ -23,10 +38,24 @@ APP_ID = _env("VOLC_APP_ID")
 ACCESS_KEY = _env("VOLC_ACCESS_KEY")
 SECRET_KEY = os.environ.get("VOLC_SECRET_KEY", "")
 RESOURCE_ID = "seed-tts-2.0"
-QUERY_URL = "https://openspeech.bytedance.com/api/v3/tts/query"
+BASE_URL = os.environ.get("VOLC_TTS_BASE_URL", "https://openspeech.bytedance.com").rstrip("/")
+QUERY_URL = f"{BASE_URL}/api/v3/tts/query"
+check_settings()
+
+# Polling schedule. The per-character synthesis rate is refined from observed history.
+DEFAULT_TIMEOUT = 1800.0
+MIN_DELAY = 0.5
+MAX_DELAY = 30.0
+BASE_SECONDS = 2.0
+SECONDS_PER_CHAR = 0.005
+HISTORY_LIMIT = 50
+DOWNLOAD_CHUNK = 1024 * 1024
+# Smaller reads while streaming, so a player gets its first bytes right away.
+STREAM_CHUNK = 16 * 1024
+_history_lock = threading.Lock()
 
 
-def query_task(task_id: str) -> dict:
+def query_task(task_id: str, session: requests.Session | None = None) -> dict:
     request_id = str(uuid.uuid4())
     headers = {
         "Content-Type": "application/json",
@@ -36,50 +65,742 @@ def query_task(task_id: str) -> dict:
         "X-Api-Request-Id": request_id,
     }
     payload = {"task_id": task_id}
-    resp = requests.post(QUERY_URL, headers=headers, json=payload, timeout=30)
+    resp = tts_retry.send(
+        lambda: (session or requests).post(QUERY_URL, headers=headers, json=payload, timeout=30),
+        "poll",
+    )
     resp.raise_for_status()
     return resp.json()
 
 
-def download_audio(url: str, output_path: str) -> None:
+class TaskFailed(Exception):
+    """Task ended in failure, returned no audio, or did not finish in time."""
+
+    def __init__(self, message: str, result: dict | None = None) -> None:
+        super().__init__(message)
+        self.result = result
+
+
+def _history_path() -> str:
+    return os.path.join(tts_cache.cache_dir(), "poll_history.json")
+
+
+def load_history() -> list[list[float]]:
+    """Recent (chars, seconds-to-done) samples of finished tasks."""
+    try:
+        with open(_history_path(), "r", encoding="utf-8") as f:
+            samples = json.load(f)
+    except (OSError, ValueError):
+        return []
+    if not isinstance(samples, list):
+        return []
+    return [s for s in samples if isinstance(s, list) and len(s) == 2]
+
+
+def record_history(chars: int, seconds: float) -> None:
+    path = _history_path()
+    with _history_lock:
+        samples = (load_history() + [[chars, round(seconds, 2)]])[-HISTORY_LIMIT:]
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(samples, f)
+        os.replace(tmp_path, path)
+
+
+def estimate_seconds(chars: int | None, history: list[list[float]]) -> float:
+    """Expected time to done: fixed queue overhead plus a per-character rate."""
+    if not chars:
+        return BASE_SECONDS
+    rates = [max(0.0, sec - BASE_SECONDS) / c for c, sec in history if c > 0]
+    rate = statistics.median(rates) if len(rates) >= 3 else SECONDS_PER_CHAR
+    return BASE_SECONDS + rate * chars
+
+
+def _progress(data: dict) -> float | None:
+    """Server-reported completion fraction, when the response carries one."""
+    value = data.get("progress")
+    if not isinstance(value, (int, float)) or value <= 0:
+        return None
+    return value / 100 if value > 1 else value
+
+
+class PollSchedule:
+    """Sleep through most of the expected synthesis time, then back off
+    exponentially with full jitter until done or the deadline passes."""
+
+    def __init__(self, chars: int | None = None, timeout: float = DEFAULT_TIMEOUT) -> None:
+        self.start = time.monotonic()
+        self.deadline = self.start + timeout
+        self.estimate = estimate_seconds(chars, load_history() if chars else [])
+        self.backoff = MIN_DELAY
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.start
+
+    def next_delay(self, data: dict | None = None, retry_after: float | None = None) -> float | None:
+        """Seconds to wait before the next poll, or None once the deadline has passed."""
+        now = time.monotonic()
+        if now >= self.deadline:
+            return None
+        if retry_after is not None:
+            delay = retry_after
+        else:
+            elapsed = now - self.start
+            progress = _progress(data or {})
+            expected = elapsed / progress if progress and progress < 1 else self.estimate
+            remaining = expected - elapsed
+            if remaining > MIN_DELAY:
+                delay = remaining * 0.8
+            else:
+                self.backoff = min(MAX_DELAY, self.backoff * 2)
+                delay = random.uniform(MIN_DELAY, self.backoff)
+        return max(MIN_DELAY, min(delay, MAX_DELAY, self.deadline - now))
+
+
+def _retry_after(exc: requests.HTTPError) -> float | None:
+    """Retry-After seconds on a throttled/unavailable reply; None if the error is not retryable."""
+    resp = exc.response
+    if resp is None or resp.status_code not in (429, 503):
+        return None
+    delay = tts_ratelimit.retry_after(resp.headers, MIN_DELAY)
+    if resp.status_code == 429:
+        tts_ratelimit.pause(delay)  # over quota: hold back every process, not just this poll
+    return delay
+
+
+def poll_once(
+    task_id: str, session: requests.Session | None = None
+) -> tuple[str | None, dict, float | None]:
+    """Query once and return (audio_url, data, retry_after); audio_url is None until done.
+
+    Raises TaskFailed if the task failed or finished without audio.
+    """
+    try:
+        result = query_task(task_id, session)
+    except requests.HTTPError as exc:
+        hint = _retry_after(exc)
+        if hint is None:
+            raise
+        return None, {}, hint
+    data = result.get("data") or {}
+    status = data.get("task_status")
+    if status == 2:
+        audio_url = data.get("audio_url")
+        if not audio_url:
+            raise TaskFailed("Task succeeded but no audio_url returned.", result)
+        return audio_url, data, None
+    elif status == 3:
+        raise TaskFailed("Task failed!", result)
+    return None, data, None
+
+
+def wait_for_task(
+    task_id: str,
+    session: requests.Session | None = None,
+    on_poll: Callable[[int, object], None] | None = None,
+    chars: int | None = None,
+    timeout: float = DEFAULT_TIMEOUT,
+    span: tts_metrics.Span | None = None,
+) -> str:
+    """Poll until the task succeeds and return its audio_url; raise TaskFailed otherwise."""
+    schedule = PollSchedule(chars, timeout)
+    polls = 0
+    while True:
+        polls += 1
+        audio_url, data, hint = poll_once(task_id, session)
+        if span:
+            span.poll(data)
+        if on_poll:
+            on_poll(polls, data.get("task_status"))
+        if audio_url:
+            if chars:
+                record_history(chars, schedule.elapsed())
+            return audio_url
+        delay = schedule.next_delay(data, hint)
+        if delay is None:
+            raise TaskFailed("Timed out waiting for task completion.")
+        time.sleep(delay)
+
+
+def _part_validator(resp: requests.Response) -> dict:
+    return {
+        "etag": resp.headers.get("ETag"),
+        "last_modified": resp.headers.get("Last-Modified"),
+    }
+
+
+def _same_file(stored: dict, current: dict) -> bool:
+    """Whether a 206 is a slice of the file whose validator was stored with `.part`."""
+    if stored.get("etag"):
+        return stored["etag"] == current["etag"]
+    if stored.get("last_modified"):
+        return stored["last_modified"] == current["last_modified"]
+    return True
+
+
+def _load_part_meta(meta_path: str) -> dict:
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return meta if isinstance(meta, dict) else {}
+
+
+def _total_length(resp: requests.Response, offset: int) -> int | None:
+    """Full file size from Content-Range (206) or Content-Length (200)."""
+    if resp.status_code == 206:
+        total = resp.headers.get("Content-Range", "").rpartition("/")[2]
+        return int(total) if total.isdigit() else None
+    length = resp.headers.get("Content-Length")
+    return int(length) if length and length.isdigit() else None
+
+
+class StreamSink:
+    """Forward downloaded bytes to a live listener (stdout or a player's pipe) once, in order.
+
+    Bytes a retry re-delivers are skipped; if the listener goes away the
+    download simply carries on to the file.
+    """
+
+    def __init__(self, stream: BinaryIO) -> None:
+        self.stream: BinaryIO | None = stream
+        self.sent = 0
+
+    def feed(self, data: bytes, pos: int) -> None:
+        """Deliver `data`, which starts at byte `pos` of the file."""
+        skip = self.sent - pos
+        if self.stream is None or skip >= len(data):
+            return
+        try:
+            self.stream.write(data[skip:] if skip > 0 else data)
+            self.stream.flush()
+        except OSError:
+            self.stream = None
+            return
+        self.sent = pos + len(data)
+
+    def catch_up(self, part_path: str, offset: int) -> None:
+        """Replay bytes of a resumed `.part` that the listener has not seen yet."""
+        if self.stream is None or self.sent >= offset:
+            return
+        with open(part_path, "rb") as f:
+            f.seek(self.sent)
+            while self.sent < offset:
+                data = f.read(min(DOWNLOAD_CHUNK, offset - self.sent))
+                if not data:
+                    break
+                self.feed(data, self.sent)
+
+
+def download_audio(
+    url: str,
+    output_path: str,
+    session: requests.Session | None = None,
+    attempts: int = 5,
+    sink: StreamSink | None = None,
+) -> int:
+    """Download into `<output>.part` and rename into place once the length checks out;
+    return the number of bytes fetched over the network.
+
+    Interrupted transfers resume with an HTTP Range request. A `.part` left by an
+    earlier run is only resumed when the server's ETag/Last-Modified still match
+    (sent as If-Range, and checked again on the 206 for servers that ignore it), so a
+    stale partial file can never be spliced into new audio.
+    With a `sink`, bytes are also streamed to it as they arrive.
+    """
     parent = os.path.dirname(output_path)
     if parent:
         os.makedirs(parent, exist_ok=True)
-    resp = requests.get(url, stream=True, timeout=60)
-    resp.raise_for_status()
-    with open(output_path, "wb") as f:
-        for chunk in resp.iter_content(chunk_size=8192):
-            f.write(chunk)
+    part_path = f"{output_path}.part"
+    meta_path = f"{part_path}.json"
+    meta = _load_part_meta(meta_path)
+    validator = meta.get("etag") or meta.get("last_modified")
+    # Bytes already in .part are trusted if this call wrote them or a validator vouches for them.
+    resumable = bool(validator)
+    fetched = 0
+    for attempt in range(1, attempts + 1):
+        offset = os.path.getsize(part_path) if resumable and os.path.exists(part_path) else 0
+        headers = {}
+        if offset:
+            headers["Range"] = f"bytes={offset}-"
+            if validator:
+                headers["If-Range"] = validator
+        total = None
+        try:
+            resp = (session or requests).get(url, headers=headers, stream=True, timeout=60)
+            if resp.status_code == 416 and offset:
+                resp.close()
+                resumable = False  # .part is at or past the end; start over to verify
+                continue
+            resp.raise_for_status()
+            current = _part_validator(resp)
+            if resp.status_code == 206 and offset and not _same_file(meta, current):
+                resp.close()
+                resumable = False  # the server ignored If-Range; .part is of other audio
+                continue
+            if resp.status_code != 206:
+                offset = 0  # range ignored, or If-Range no longer matches
+            total = _total_length(resp, offset)
+            meta = current
+            validator = current["etag"] or current["last_modified"]
+            if validator:
+                with open(meta_path, "w", encoding="utf-8") as f:
+                    json.dump(current, f)
+            resumable = True
+            if sink:
+                sink.catch_up(part_path, offset)
+            pos = offset
+            chunk_size = STREAM_CHUNK if sink else DOWNLOAD_CHUNK
+            with resp, open(part_path, "ab" if offset else "wb") as f:
+                for chunk in resp.iter_content(chunk_size=chunk_size):
+                    f.write(chunk)
+                    if sink:
+                        sink.feed(chunk, pos)
+                    pos += len(chunk)
+                    fetched += len(chunk)
+        except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError):
+            if attempt == attempts:
+                raise
+            time.sleep(min(MAX_DELAY, MIN_DELAY * 2**attempt))
+            continue
+        size = os.path.getsize(part_path)
+        if total is not None and size != total:
+            resumable = size < total
+            continue
+        os.replace(part_path, output_path)
+        try:
+            os.remove(meta_path)
+        except OSError:
+            pass
+        return fetched
+    raise requests.ConnectionError(f"Incomplete download of {output_path} after {attempts} attempts")
+
+
+def fetch_cached(task_id: str, output_path: str) -> bool:
+    """Serve a `cache:<key>` pseudo task id from the local cache."""
+    return tts_cache.fetch(task_id[len(tts_cache.CACHED_PREFIX):], output_path)
+
+
+def finish_download(
+    task_id: str,
+    output_path: str,
+    use_cache: bool = True,
+    span: tts_metrics.Span | None = None,
+) -> None:
+    """Cache the audio under its journaled text hash and mark the task done.
+
+    A given `span` gets the time from the journaled submit to audio on disk.
+    """
+    row = tts_journal.lookup(task_id)
+    if row and use_cache:
+        tts_cache.store(row["text_hash"], output_path)
+    tts_journal.mark_done(task_id, output_path)
+    if span and row:
+        span.add("time_to_audio", time.time() - row["submitted_at"])
+        span.fields.setdefault("chars", row["chars"])
+
+
+def _take_over(task_id: str, output_path: str) -> bool:
+    """Reuse the audio of a concurrent flight for `task_id` that has just finished.
+
+    Returns False if that flight did not get the audio; raises TaskFailed if the task failed.
+    """
+    row = tts_journal.lookup(task_id)
+    if not row or row["status"] == "submitted":
+        return False
+    if row["status"] == "failed":
+        raise TaskFailed(row["error"] or "Task failed!")
+    if tts_cache.fetch(row["text_hash"], output_path):
+        return True
+    source = row["output"]
+    if not source or not os.path.exists(source):
+        return False
+    if os.path.abspath(source) != os.path.abspath(output_path):
+        parent = os.path.dirname(output_path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        shutil.copyfile(source, output_path)
+    return True
+
+
+def sniff_format(path: str) -> str | None:
+    """Audio format from the file's magic bytes: mp3, ogg_opus, wav, or None if unrecognized."""
+    with open(path, "rb") as f:
+        head = f.read(4)
+    if head[:3] == b"ID3" or (len(head) >= 2 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0):
+        return "mp3"
+    if head == b"OggS":
+        return "ogg_opus"
+    if head == b"RIFF":
+        return "wav"
+    return None
+
+
+def check_audio(path: str, expected: str | None) -> None:
+    """Reject a download that is not audio of the `expected` format (raw PCM is not checked)."""
+    expected = expected or "mp3"
+    if expected == "pcm":
+        return
+    actual = sniff_format(path)
+    if actual is None:
+        os.remove(path)
+        raise TaskFailed(f"Downloaded file is not {expected} audio; removed {path}")
+    if actual != expected:
+        print(f"Warning: requested {expected} but got {actual} audio in {path}", file=sys.stderr)
+
+
+def _download_and_finish(
+    task_id: str,
+    url: str,
+    output_path: str,
+    session: requests.Session | None,
+    use_cache: bool,
+    span: tts_metrics.Span | None,
+    sink: StreamSink | None = None,
+) -> None:
+    with span.phase("download") if span else nullcontext():
+        fetched = download_audio(url, output_path, session, sink=sink)
+    if span:
+        span.bytes += fetched
+    row = tts_journal.lookup(task_id)
+    check_audio(output_path, row["format"] if row else None)
+    # Still inside the flight, so a waiting follower finds the audio cached and journaled.
+    finish_download(task_id, output_path, use_cache, span)
+
+
+def await_audio(
+    task_id: str,
+    output_path: str,
+    session: requests.Session | None = None,
+    chars: int | None = None,
+    timeout: float = DEFAULT_TIMEOUT,
+    use_cache: bool = True,
+    span: tts_metrics.Span | None = None,
+    sink: StreamSink | None = None,
+    on_poll: Callable[[int, object], None] | None = None,
+) -> None:
+    """Poll `task_id`, download its audio and record it in the journal and cache.
+
+    If another process or thread is already doing that for the same task (e.g. two
+    agents reattached to one submission), wait for it and reuse its audio instead.
+    """
+    with tts_journal.flight(f"task-{task_id}") as waited:
+        if waited and _take_over(task_id, output_path):
+            if sink:
+                sink.catch_up(output_path, os.path.getsize(output_path))
+            return
+        audio_url = wait_for_task(task_id, session, on_poll, chars, timeout, span)
+        _download_and_finish(task_id, audio_url, output_path, session, use_cache, span, sink)
+
+
+def download_task(
+    task_id: str,
+    url: str,
+    output_path: str,
+    session: requests.Session | None = None,
+    use_cache: bool = True,
+    span: tts_metrics.Span | None = None,
+) -> None:
+    """Download a finished task's audio, unless a concurrent flight for it already has."""
+    with tts_journal.flight(f"task-{task_id}") as waited:
+        if waited and _take_over(task_id, output_path):
+            return
+        _download_and_finish(task_id, url, output_path, session, use_cache, span)
+
+
+def resume_tasks() -> list[dict]:
+    """Unfinished journaled tasks, in the record shape `run_many` takes."""
+    tasks = []
+    for row in tts_journal.unfinished():
+        task = {"task_id": row["task_id"], "chars": row["chars"]}
+        if row["source"]:
+            task["file"] = row["source"]
+        if row["output"]:
+            task["output"] = row["output"]
+        if row["format"]:
+            task["format"] = row["format"]
+        tasks.append(task)
+    return tasks
+
+
+def open_stream(dest: str) -> BinaryIO:
+    """Binary stdout for `-`, else open `dest` for writing (blocks until a FIFO has a reader)."""
+    if dest == "-":
+        return os.fdopen(os.dup(sys.stdout.fileno()), "wb", buffering=0)
+    return open(dest, "wb", buffering=0)
+
+
+def load_tasks(task_ids: list[str], batch_file: str | None) -> list[dict]:
+    """Task records from bare ids and/or `tts_submit.py --batch` NDJSON (`-` for stdin)."""
+    tasks = [{"task_id": task_id} for task_id in task_ids]
+    if batch_file:
+        f = sys.stdin if batch_file == "-" else open(batch_file, "r", encoding="utf-8")
+        with f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    tasks.append(json.loads(line))
+    return tasks
+
+
+def assign_outputs(tasks: list[dict], out_dir: str) -> None:
+    """Name each output after its source file (or task id) with its format's extension,
+    disambiguating clashes.
+
+    Tasks that already have an output (e.g. resumed from the journal) keep it.
+    """
+    used: set[str] = set()
+    for task in tasks:
+        if "task_id" not in task or task.get("output"):
+            continue
+        stem = os.path.splitext(os.path.basename(task["file"]))[0] if task.get("file") else ""
+        fmt = task.get("format")
+        if not fmt and (row := tts_journal.lookup(task["task_id"])):
+            fmt = row["format"]
+        ext = AUDIO_FORMATS.get(fmt or "mp3", ".mp3")
+        name = f"{stem or task['task_id']}{ext}"
+        if name in used:
+            name = f"{stem}-{task['task_id']}{ext}"
+        used.add(name)
+        task["output"] = os.path.join(out_dir, name)
+
+
+def _describe(exc: Exception) -> str:
+    """Error text for a task's record; unexpected exceptions keep their type name."""
+    if isinstance(exc, (TaskFailed, OSError)):
+        return str(exc)
+    return f"{type(exc).__name__}: {exc}"
+
+
+def run_many(tasks: list[dict], jobs: int, timeout: float, use_cache: bool = True) -> int:
+    """Poll every task from one scheduler loop and download each as soon as it is done.
+
+    At most `jobs` queries and `jobs` downloads are in flight at once; one NDJSON
+    line is printed per task as it finishes.
+    """
+    failed = 0
+
+    def emit(record: dict) -> None:
+        nonlocal failed
+        if "error" in record:
+            failed += 1
+        print(json.dumps(record, ensure_ascii=False), flush=True)
+
+    heap: list[tuple[float, int]] = []
+    schedules: dict[int, PollSchedule] = {}
+    spans: dict[int, tts_metrics.Span] = {}
+    for i, task in enumerate(tasks):
+        if "task_id" not in task:
+            emit(task)  # a failed submit passed through from tts_submit.py
+            continue
+        # Here and in the workers below, whatever goes wrong with one task (a malformed
+        # record, a bad setting, a journal error) becomes its error record, not the batch's.
+        try:
+            if task["task_id"].startswith(tts_cache.CACHED_PREFIX):
+                if fetch_cached(task["task_id"], task["output"]):
+                    tts_metrics.Span("tts_query", task_id=task["task_id"]).finish("cached")
+                    emit({**task, "cached": True})
+                else:
+                    emit({**task, "error": "cache entry is gone; resubmit the file"})
+                continue
+            tts_journal.set_output(task["task_id"], task["output"])
+            schedules[i] = PollSchedule(task.get("chars"), timeout)
+        except Exception as exc:
+            emit({**task, "error": _describe(exc)})
+            continue
+        spans[i] = tts_metrics.Span("tts_query", task_id=task["task_id"], file=task.get("file"))
+        heap.append((0.0, i))
+
+    queries: dict[Future, int] = {}
+    downloads: dict[Future, int] = {}
+    query_pool = ThreadPoolExecutor(jobs)
+    download_pool = ThreadPoolExecutor(jobs)
+    with make_session(jobs * 2) as session, query_pool, download_pool:
+        while heap or queries or downloads:
+            now = time.monotonic()
+            while heap and heap[0][0] <= now and len(queries) < jobs:
+                _, i = heapq.heappop(heap)
+                queries[query_pool.submit(poll_once, tasks[i]["task_id"], session)] = i
+            wait_for = None
+            if heap and len(queries) < jobs:
+                wait_for = max(0.0, heap[0][0] - now)
+            if not queries and not downloads:
+                time.sleep(wait_for or 0)
+                continue
+            done, _ = wait(list(queries) + list(downloads), wait_for, FIRST_COMPLETED)
+            for future in done:
+                if future in queries:
+                    i = queries.pop(future)
+                    task = tasks[i]
+                    try:
+                        audio_url, data, hint = future.result()
+                    except Exception as exc:
+                        if isinstance(exc, TaskFailed):
+                            tts_journal.mark_failed(task["task_id"], str(exc))
+                        spans[i].finish("failed", error=_describe(exc))
+                        emit({**task, "error": _describe(exc)})
+                        continue
+                    spans[i].poll(data)
+                    if audio_url:
+                        if task.get("chars"):
+                            record_history(task["chars"], schedules[i].elapsed())
+                        job = download_pool.submit(
+                            download_task,
+                            task["task_id"],
+                            audio_url,
+                            task["output"],
+                            session,
+                            use_cache,
+                            spans[i],
+                        )
+                        downloads[job] = i
+                        continue
+                    delay = schedules[i].next_delay(data, hint)
+                    if delay is None:
+                        spans[i].finish("failed", error="timed out")
+                        emit({**task, "error": "timed out waiting for task completion"})
+                    else:
+                        heapq.heappush(heap, (time.monotonic() + delay, i))
+                else:
+                    i = downloads.pop(future)
+                    task = tasks[i]
+                    try:
+                        future.result()
+                    except Exception as exc:
+                        spans[i].finish("failed", error=_describe(exc))
+                        emit({**task, "error": _describe(exc)})
+                        continue
+                    spans[i].finish("done")
+                    emit(task)
+    print(f"Downloaded {len(tasks) - failed}/{len(tasks)} tasks", file=sys.stderr)
+    return 1 if failed else 0
 
 
 def main() -> int:
-    parser = argparse.ArgumentParser(description="Poll a TTS task and download the audio.")
-    parser.add_argument("task_id", help="Task ID returned by the submit endpoint.")
-    parser.add_argument("output", help="Local file path to save the downloaded MP3.")
+    parser = argparse.ArgumentParser(
+        description="Poll TTS task(s) and download the audio.",
+        epilog="Single task: tts_query.py TASK_ID OUTPUT. Many: tts_query.py --out-dir DIR "
+        "[--batch tasks.ndjson|-] [TASK_ID ...].",
+    )
+    parser.add_argument(
+        "args",
+        nargs="*",
+        metavar="TASK_ID [OUTPUT]",
+        help="Task ID returned by the submit endpoint and the local audio path; with --out-dir, "
+        "any number of task IDs.",
+    )
+    parser.add_argument(
+        "--batch",
+        metavar="NDJSON",
+        help="Read tasks from `tts_submit.py --batch` output (`-` for stdin).",
+    )
+    parser.add_argument("--out-dir", help="Directory for outputs when handling many tasks.")
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Also finish every unfinished task in the journal (e.g. after a crash), "
+        "saving each to the output it was started with.",
+    )
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=8, help="Concurrent polls and downloads (default: 8)."
+    )
+    parser.add_argument(
+        "--chars",
+        type=int,
+        default=None,
+        help="Cleaned text length (the submit output's `chars`); lets polling start near the expected finish.",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=DEFAULT_TIMEOUT,
+        help=f"Give up after this many seconds (default: {DEFAULT_TIMEOUT:.0f}).",
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true", help="Do not add the downloaded audio to the local cache."
+    )
+    parser.add_argument(
+        "--stream",
+        metavar="DEST",
+        help="Also stream the audio while it downloads: `-` for stdout (status lines move to "
+        "stderr) or a path such as a named pipe a player reads from. Single task only.",
+    )
     args = parser.parse_args()
 
-    print(f"Polling task {args.task_id} ...")
-    for i in range(120):
-        result = query_task(args.task_id)
-        status = result.get("data", {}).get("task_status")
-        print(f"  poll {i + 1}: status={status}")
-        if status == 2:
-            audio_url = result["data"].get("audio_url")
-            if not audio_url:
-                print("Task succeeded but no audio_url returned.", file=sys.stderr)
-                return 1
-            print(f"Downloading audio to {args.output} ...")
-            download_audio(audio_url, args.output)
-            print(args.output)
-            return 0
-        elif status == 3:
-            print("\nTask failed!")
-            print(json.dumps(result, ensure_ascii=False, indent=2))
+    if args.out_dir or args.batch or args.resume:
+        tasks = load_tasks(args.args, args.batch)
+        if args.resume:
+            seen = {task.get("task_id") for task in tasks}
+            tasks += [task for task in resume_tasks() if task["task_id"] not in seen]
+        if args.out_dir:
+            assign_outputs(tasks, args.out_dir)
+        elif any("task_id" in task and not task.get("output") for task in tasks):
+            parser.error("--out-dir is required for tasks without a known output path")
+        if args.stream:
+            parser.error("--stream handles a single task")
+        return run_many(tasks, max(1, args.jobs), args.timeout, not args.no_cache)
+    if len(args.args) != 2:
+        parser.error("expected TASK_ID OUTPUT (or --out-dir for many tasks)")
+    task_id, output = args.args
+    # Keep stdout clean for audio bytes when streaming there.
+    log = sys.stderr if args.stream == "-" else sys.stdout
+
+    span = tts_metrics.Span("tts_query", task_id=task_id)
+    if task_id.startswith(tts_cache.CACHED_PREFIX):
+        if not fetch_cached(task_id, output):
+            print(f"Cache entry {task_id} is gone; resubmit the file.", file=sys.stderr)
             return 1
-        time.sleep(5)
+        span.finish("cached")
+        if args.stream:
+            with open_stream(args.stream) as stream:
+                StreamSink(stream).catch_up(output, os.path.getsize(output))
+        print(output, file=log)
+        return 0
+
+    tts_journal.set_output(task_id, output)
+    row = tts_journal.lookup(task_id)
+    ext = AUDIO_FORMATS.get(row["format"] or "mp3") if row else None
+    if ext and not output.endswith(ext):
+        fmt = row["format"] or "mp3"
+        print(f"Warning: task {task_id} is {fmt}; consider a {ext} output name", file=sys.stderr)
+    print(f"Polling task {task_id} ...", file=log)
+
+    def on_poll(n: int, status: object) -> None:
+        print(f"  poll {n}: status={status}", file=log, flush=True)
+        if status == 2:
+            print(f"Downloading audio to {output} ...", file=log, flush=True)
 
-    print("Timed out waiting for task completion.", file=sys.stderr)
-    return 1
+    try:
+        with open_stream(args.stream) if args.stream else nullcontext() as stream:
+            await_audio(
+                task_id,
+                output,
+                chars=args.chars,
+                timeout=args.timeout,
+                use_cache=not args.no_cache,
+                span=span,
+                sink=StreamSink(stream) if stream else None,
+                on_poll=on_poll,
+            )
+    except TaskFailed as exc:
+        span.finish("failed", error=str(exc))
+        if exc.result is not None:
+            tts_journal.mark_failed(task_id, str(exc))
+        if exc.result is not None and exc.result.get("data", {}).get("task_status") == 3:
+            print(f"\n{exc}", file=log)
+            print(json.dumps(exc.result, ensure_ascii=False, indent=2), file=log)
+        else:
+            print(exc, file=sys.stderr)
+        return 1
+    except (requests.RequestException, OSError) as exc:
+        span.finish("failed", error=str(exc))
+        print(f"{exc}; finish it later with tts_query.py --resume", file=sys.stderr)
+        return 1
+    span.finish("done")
+    print(output, file=log)
+    return 0
 
 
 if __name__ == "__main__":
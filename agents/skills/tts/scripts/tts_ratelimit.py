@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""Token bucket shared by every TTS process of this user, kept in a locked runtime file.
+
+Each submit and query call takes a token before it goes out; when the bucket is
+empty the caller waits for a refill instead of tripping the provider's rate
+limit. Submits may drain the bucket, polls only take tokens above a reserve, so
+queued submits go first. A 429 from the API pauses every process until its
+Retry-After has passed.
+
+    TTS_RATE_LIMIT   sustained requests per second across all processes (default: 10; 0 disables)
+    TTS_RATE_BURST   bucket size (default: the rate)
+"""
+
+import argparse
+import fcntl
+import json
+import os
+import sys
+import tempfile
+import time
+
+from tts_common import env_number
+
+DEFAULT_RATE = 10.0
+# Longest single sleep, so a waiter notices a changed limit or an expired pause promptly.
+MAX_SLEEP = 1.0
+
+
+def state_path() -> str:
+    runtime = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    return os.path.join(runtime, f"tts-ratelimit-{os.getuid()}.json")
+
+
+def rate() -> float:
+    return env_number("TTS_RATE_LIMIT", DEFAULT_RATE)
+
+
+def burst() -> float:
+    return max(1.0, env_number("TTS_RATE_BURST", rate()))
+
+
+def locked_json(path: str, change) -> object:
+    """Run `change(state)` on the JSON object in `path` under an exclusive flock.
+
+    The file is rewritten only if `change` modified the state. Returns its result.
+    """
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        raw = os.pread(fd, 4096, 0)
+        try:
+            state = json.loads(raw) if raw else {}
+        except ValueError:
+            state = {}
+        before = dict(state)
+        result = change(state)
+        if state != before:
+            data = json.dumps(state).encode()
+            os.ftruncate(fd, 0)
+            os.pwrite(fd, data, 0)
+        return result
+    finally:
+        os.close(fd)  # also releases the lock
+
+
+def _update(change) -> object:
+    """Refill the shared bucket, then run `change(state, now)` on it."""
+
+    def refill(state: dict) -> object:
+        now = time.time()
+        tokens = state.get("tokens", burst())
+        updated = state.get("updated", now)
+        state["tokens"] = min(burst(), tokens + max(0.0, now - updated) * rate())
+        state["updated"] = now
+        return change(state, now)
+
+    return locked_json(state_path(), refill)
+
+
+def acquire(kind: str = "submit", timeout: float | None = None) -> float:
+    """Block until a token for a `submit` or `poll` call is available; return seconds waited.
+
+    Raises TimeoutError if `timeout` seconds pass first.
+    """
+    per_second = rate()
+    if per_second <= 0:
+        return 0.0
+    # Polls leave half the bucket to submits, so a waiting submit never queues behind them.
+    floor = 1.0 if kind == "submit" else min(burst(), 1.0 + burst() / 2)
+
+    def take(state: dict, now: float) -> float:
+        paused = state.get("paused_until", 0.0) - now
+        if paused > 0:
+            return paused
+        if state["tokens"] >= floor:
+            state["tokens"] -= 1.0
+            return 0.0
+        return (floor - state["tokens"]) / per_second
+
+    started = time.monotonic()
+    while True:
+        delay = _update(take)
+        if delay <= 0:
+            return time.monotonic() - started
+        if timeout is not None and time.monotonic() + delay - started > timeout:
+            raise TimeoutError(f"TTS rate limiter: no {kind} slot within {timeout:.0f}s")
+        time.sleep(min(delay, MAX_SLEEP))
+
+
+def pause(seconds: float) -> bool:
+    """Stop every process from calling the API for `seconds` (after a 429).
+
+    Returns False when the limiter is disabled and nothing was recorded.
+    """
+    if rate() <= 0:
+        return False
+
+    def extend(state: dict, now: float) -> None:
+        state["paused_until"] = max(state.get("paused_until", 0.0), now + seconds)
+        state["tokens"] = 0.0
+
+    _update(extend)
+    return True
+
+
+def retry_after(headers, default: float = 1.0) -> float:
+    """Seconds from a Retry-After header (delta-seconds form), else `default`."""
+    try:
+        return max(0.0, float(headers.get("Retry-After", default)))
+    except ValueError:
+        return default
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Inspect or reset the shared TTS rate limiter.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("status", help="Print the bucket state as JSON.")
+    sub.add_parser("reset", help="Refill the bucket and clear any pause.")
+    args = parser.parse_args()
+
+    try:
+        burst()  # reads both variables
+    except ValueError as exc:
+        print(f"Invalid rate limit settings: {exc}", file=sys.stderr)
+        return 1
+    if args.command == "reset":
+        _update(lambda state, now: state.update(tokens=burst(), paused_until=0.0))
+    state = _update(lambda state, now: dict(state))
+    state.update(path=state_path(), rate=rate(), burst=burst())
+    state["paused_for"] = max(0.0, round(state.get("paused_until", 0.0) - time.time(), 3))
+    print(json.dumps(state))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""Retries and a circuit breaker around the TTS API calls.
+
+Timeouts, dropped connections and 5xx replies are retried with bounded,
+jittered exponential backoff; the caller re-sends the very same request, so a
+retried submit keeps its `unique_id` and `X-Api-Request-Id` and cannot create a
+second task. 429s wait for the shared rate limiter instead of counting as
+failures. After `TTS_BREAKER_THRESHOLD` consecutive failures (default 5, across
+every process of the user; 0 disables) the circuit opens: calls fail fast for
+`TTS_BREAKER_COOLDOWN` seconds (default 30), then a single probe call decides
+whether to close it again.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Callable
+
+import requests
+
+import tts_ratelimit
+from tts_common import env_number
+
+RETRY_STATUSES = frozenset({500, 502, 503, 504})
+ATTEMPTS = 4
+BASE_DELAY = 0.5
+MAX_DELAY = 8.0
+# How long a throttled call keeps queueing before the 429 is reported.
+QUEUE_TIMEOUT = 600.0
+# A probe that has not reported back by then is presumed lost; let another one through.
+PROBE_TIMEOUT = 60.0
+
+
+class CircuitOpen(requests.ConnectionError):
+    """The endpoint failed repeatedly; calls are refused until the cooldown ends."""
+
+
+def breaker_path() -> str:
+    runtime = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    return os.path.join(runtime, f"tts-breaker-{os.getuid()}.json")
+
+
+def threshold() -> int:
+    return env_number("TTS_BREAKER_THRESHOLD", 5, integer=True)
+
+
+def cooldown() -> float:
+    return env_number("TTS_BREAKER_COOLDOWN", 30.0)
+
+
+def _admit(state: dict) -> float:
+    """Seconds the circuit stays open, or 0 if this call may go out (possibly as the probe)."""
+    now = time.time()
+    open_until = state.get("open_until", 0.0)
+    if not open_until:
+        return 0.0
+    if now < open_until:
+        return open_until - now
+    if now < state.get("probe_until", 0.0):
+        return state["probe_until"] - now  # another process is probing
+    state["probe_until"] = now + PROBE_TIMEOUT
+    return 0.0
+
+
+def _record(state: dict, ok: bool) -> None:
+    if ok:
+        state.clear()
+        return
+    state["failures"] = state.get("failures", 0) + 1
+    if state["failures"] >= threshold():
+        state["open_until"] = time.time() + cooldown()
+        state.pop("probe_until", None)
+
+
+def _backoff(attempt: int) -> float:
+    return random.uniform(BASE_DELAY, min(MAX_DELAY, BASE_DELAY * 2**attempt))
+
+
+def send(
+    request: Callable[[], requests.Response], kind: str = "submit", attempts: int = ATTEMPTS
+) -> requests.Response:
+    """Call `request()` (which must re-send an identical request) until a final reply.
+
+    Returns the last response, which may still be a 5xx or 429 once retries or the
+    queueing time are used up; raises the last network error, or CircuitOpen.
+    """
+    breaker = threshold() > 0
+    deadline = time.monotonic() + QUEUE_TIMEOUT
+    failures = 0
+    while True:
+        if breaker and (wait := tts_ratelimit.locked_json(breaker_path(), _admit)):
+            raise CircuitOpen(f"TTS API circuit open after repeated failures; retry in {wait:.0f}s")
+        tts_ratelimit.acquire(kind)
+        try:
+            resp = request()
+        except (requests.ConnectionError, requests.Timeout) as exc:
+            error, resp = exc, None
+        else:
+            if resp.status_code == 429 and time.monotonic() < deadline:
+                # Over quota, not broken: queue behind every other process and re-send.
+                delay = tts_ratelimit.retry_after(resp.headers)
+                print(f"TTS {kind} throttled; retrying in {delay:.1f}s", file=sys.stderr)
+                if not tts_ratelimit.pause(delay):
+                    time.sleep(delay)
+                continue
+            if resp.status_code not in RETRY_STATUSES:
+                if breaker:
+                    tts_ratelimit.locked_json(breaker_path(), lambda s: _record(s, True))
+                return resp
+            error = f"HTTP {resp.status_code}"
+        if breaker:
+            tts_ratelimit.locked_json(breaker_path(), lambda s: _record(s, False))
+        failures += 1
+        if failures >= attempts:
+            if resp is None:
+                raise error
+            return resp
+        delay = _backoff(failures)
+        if resp is not None:
+            delay = max(delay, tts_ratelimit.retry_after(resp.headers, 0.0))
+        print(
+            f"TTS {kind} failed ({error}); retry {failures}/{attempts - 1} in {delay:.1f}s",
+            file=sys.stderr,
+        )
+        time.sleep(delay)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Inspect or reset the shared TTS circuit breaker.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("status", help="Print the breaker state as JSON.")
+    sub.add_parser("reset", help="Close the circuit.")
+    args = parser.parse_args()
+
+    try:
+        threshold(), cooldown()
+    except ValueError as exc:
+        print(f"Invalid breaker settings: {exc}", file=sys.stderr)
+        return 1
+    if args.command == "reset":
+        tts_ratelimit.locked_json(breaker_path(), dict.clear)
+    state = tts_ratelimit.locked_json(breaker_path(), dict)
+    open_for = max(0.0, state.get("open_until", 0.0) - time.time())
+    print(json.dumps({**state, "open_for": round(open_for, 3), "path": breaker_path()}))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
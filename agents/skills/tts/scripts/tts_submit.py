@@ -2,14 +2,23 @@
 """Submit long-text TTS task to Volcengine / ByteDance openspeech API."""
 
 import argparse
+import glob
 import json
 import os
 import re
 import sys
 import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Iterable, Iterator
 
 import requests
 
+import tts_cache
+import tts_journal
+import tts_metrics
+import tts_retry
+from tts_common import AUDIO_FORMATS, check_settings, make_session
+
 
 def _env(key: str) -> str:
     value = os.environ.get(key)
@@ -26,33 +35,151 @@ SECRET_KEY = os.environ.get("VOLC_SECRET_KEY", "")
 SPEAKER = os.environ.get("VOLC_SPEAKER", "zh_female_tianmeitaozi_uranus_bigtts")
 
 SUBMIT_RESOURCE_ID = "seed-tts-2.0"
-SUBMIT_URL = "https://openspeech.bytedance.com/api/v3/tts/submit"
+# Override to point the scripts at a stand-in server (tests, benchmarks).
+BASE_URL = os.environ.get("VOLC_TTS_BASE_URL", "https://openspeech.bytedance.com").rstrip("/")
+SUBMIT_URL = f"{BASE_URL}/api/v3/tts/submit"
+
+SAMPLE_RATES = (8000, 16000, 22050, 24000, 32000, 44100, 48000)
+
+
+def audio_params(
+    fmt: str | None = None, sample_rate: int | None = None, bit_rate: int | None = None
+) -> dict:
+    """Request audio params; unset values come from VOLC_AUDIO_FORMAT, VOLC_SAMPLE_RATE
+    and VOLC_BIT_RATE, then default to 24 kHz MP3 at the server's bitrate."""
+    fmt = fmt or os.environ.get("VOLC_AUDIO_FORMAT") or "mp3"
+    sample_rate = sample_rate or int(os.environ.get("VOLC_SAMPLE_RATE") or 24000)
+    bit_rate = bit_rate or int(os.environ.get("VOLC_BIT_RATE") or 0)
+    if fmt not in AUDIO_FORMATS:
+        choices = ", ".join(AUDIO_FORMATS)
+        raise ValueError(f"unsupported audio format {fmt!r} (choose from {choices})")
+    if sample_rate not in SAMPLE_RATES:
+        raise ValueError(f"unsupported sample rate {sample_rate}")
+    params = {"format": fmt, "sample_rate": sample_rate}
+    if bit_rate:
+        params["bit_rate"] = bit_rate
+    return params
+
+
+try:
+    # Part of every cache key and journaled hash; the default matches the original fixed params.
+    AUDIO_PARAMS = audio_params()
+except ValueError as exc:
+    print(f"Invalid audio settings: {exc}", file=sys.stderr)
+    sys.exit(1)
+check_settings()
+
+
+def add_audio_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--format",
+        choices=list(AUDIO_FORMATS),
+        default=None,
+        help=f"Audio codec (default: VOLC_AUDIO_FORMAT or {AUDIO_PARAMS['format']}).",
+    )
+    parser.add_argument(
+        "--sample-rate",
+        type=int,
+        choices=SAMPLE_RATES,
+        default=None,
+        metavar="HZ",
+        help=f"Sample rate (default: VOLC_SAMPLE_RATE or {AUDIO_PARAMS['sample_rate']}).",
+    )
+    parser.add_argument(
+        "--bit-rate",
+        type=int,
+        default=None,
+        metavar="BPS",
+        help="Bitrate hint in bit/s, e.g. 32000 for speech (default: VOLC_BIT_RATE or the server's).",
+    )
+
+
+def apply_audio_arguments(args: argparse.Namespace) -> None:
+    """Switch AUDIO_PARAMS to the --format/--sample-rate/--bit-rate given on the command line."""
+    params = audio_params(args.format, args.sample_rate, args.bit_rate)
+    AUDIO_PARAMS.clear()
+    AUDIO_PARAMS.update(params)
+
+
+# Line prefix: blockquote markers, then an ATX header or a list bullet.
+_PREFIX = re.compile(r"(?:>[ \t]?)*(?:#{1,6}[ \t]+|[ \t]*[-*+][ \t]+)?")
+_QUOTE = re.compile(r"(?:>[ \t]?)*")
+_FENCE = re.compile(r"(?:>[ \t]?)*[ \t]{0,3}(`{3,}|~{3,})")
+_RULE = re.compile(r"(?:-{3,}|\*{3,}|_{3,})[ \t]*$")
+# Links keep their text; emphasis markers and inline-code backticks are dropped.
+_LINK = re.compile(r"\[([^\]]+)\]\([^)]+\)")
+_EMPHASIS = re.compile(r"\*\*?|__?|`+")
+_PREFIX_CHARS = frozenset(">#-*+ \t")
+
+
+def iter_plain_lines(lines: Iterable[str]) -> Iterator[str]:
+    """Single-pass Markdown cleaner: drop fenced code and rules, unwrap quotes,
+    headers, lists, links and emphasis, and collapse blank-line runs.
+
+    A fence still open at the end is taken for a stray marker: the lines after it
+    are cleaned as prose rather than dropped.
+    """
+    fence = ""
+    fenced: list[str] = []
+    blank = True  # suppresses leading blank lines
+    source = iter(lines)
+    while True:
+        for line in source:
+            line = line.rstrip()
+            if fence:
+                if fence in line:
+                    body = line[_QUOTE.match(line).end():].lstrip()
+                    if body.startswith(fence) and not body.strip(fence[0]):
+                        fence = ""
+                        continue
+                fenced.append(line)
+                continue
+            if not line:
+                if not blank:
+                    blank = True
+                    yield ""
+                continue
+            # Cheap substring/first-char checks keep regexes off the common plain-prose line.
+            if ("``" in line or "~~" in line) and (match := _FENCE.match(line)):
+                fence = match.group(1)
+                fenced = []
+                continue
+            if line[0] in _PREFIX_CHARS:
+                line = line[_PREFIX.match(line).end():]
+                if line[:1] in "-*_" and _RULE.match(line):
+                    line = ""
+            if "](" in line:
+                line = _LINK.sub(r"\1", line)
+            if "*" in line or "_" in line or "`" in line:
+                line = _EMPHASIS.sub("", line)
+            if not line or line.isspace():
+                if not blank:
+                    blank = True
+                    yield ""
+                continue
+            blank = False
+            yield line
+        if not fence:
+            return
+        source, fence = iter(fenced), ""
+
+
+def _join(lines: Iterator[str]) -> str:
+    return "\n".join(lines).strip()
 
 
 def md_to_plain(text: str) -> str:
     """Strip markdown formatting for TTS."""
-    # Remove blockquotes
-    text = re.sub(r"^>\s?", "", text, flags=re.MULTILINE)
-    # Remove headers
-    text = re.sub(r"^#{1,6}\s+", "", text, flags=re.MULTILINE)
-    # Remove links [text](url) -> text
-    text = re.sub(r"\[([^\]]+)\]\([^)]+\)", r"\1", text)
-    # Remove bold/italic markers
-    text = re.sub(r"\*\*?|\_\_?", "", text)
-    # Remove inline code backticks
-    text = re.sub(r"`+", "", text)
-    # Remove code blocks
-    text = re.sub(r"```[\s\S]*?```", "", text)
-    # Remove horizontal rules
-    text = re.sub(r"^---+\s*$", "", text, flags=re.MULTILINE)
-    # Remove list markers
-    text = re.sub(r"^\s*[-*+]\s+", "", text, flags=re.MULTILINE)
-    # Collapse multiple newlines
-    text = re.sub(r"\n{3,}", "\n\n", text)
-    return text.strip()
-
-
-def submit_task(text: str) -> dict:
+    return _join(iter_plain_lines(text.splitlines()))
+
+
+def md_file_to_plain(path: str) -> str:
+    """Like md_to_plain(), but streams the file line by line instead of reading it whole."""
+    with open(path, "r", encoding="utf-8") as f:
+        return _join(iter_plain_lines(f))
+
+
+def submit_task(text: str, session: requests.Session | None = None) -> dict:
     request_id = str(uuid.uuid4())
     unique_id = str(uuid.uuid4())
     headers = {
@@ -68,43 +195,211 @@ def submit_task(text: str) -> dict:
         "req_params": {
             "text": text,
             "speaker": SPEAKER,
-            "audio_params": {
-                "format": "mp3",
-                "sample_rate": 24000,
-            },
+            "audio_params": AUDIO_PARAMS,
         },
     }
-    resp = requests.post(SUBMIT_URL, headers=headers, json=payload, timeout=30)
+    # Retries re-send these exact ids, so the server sees one submission, not several.
+    resp = tts_retry.send(
+        lambda: (session or requests).post(SUBMIT_URL, headers=headers, json=payload, timeout=30),
+        "submit",
+    )
     if resp.status_code != 200:
-        print(f"Submit status: {resp.status_code}")
-        print(f"Submit body: {resp.text}")
+        print(f"Submit status: {resp.status_code}", file=sys.stderr)
+        print(f"Submit body: {resp.text}", file=sys.stderr)
     resp.raise_for_status()
     return resp.json()
 
 
+def text_cache_key(text: str) -> str:
+    return tts_cache.cache_key(text, SPEAKER, AUDIO_PARAMS)
+
+
+def cached_task_id(text: str) -> str | None:
+    """Pseudo task id for `tts_query.py` when this exact synthesis is already cached."""
+    key = text_cache_key(text)
+    if tts_cache.lookup(key) is None:
+        return None
+    return tts_cache.CACHED_PREFIX + key
+
+
+def submit_or_reattach(
+    text: str,
+    session: requests.Session | None = None,
+    source: str | None = None,
+    reattach: bool = True,
+) -> dict:
+    """Submit `text` and journal the task, or reuse the journal's in-flight task for the
+    same synthesis. A reused task comes back as a minimal response with `reattached`.
+
+    Concurrent submitters of the same synthesis (other agents, other threads) are
+    serialized on a lock keyed by its hash, so only the first one reaches the API.
+    """
+    key = text_cache_key(text)
+    if not reattach:
+        return _submit_and_record(text, key, session, source)
+    with tts_journal.flight(f"submit-{key}"):
+        if row := tts_journal.find_inflight(key):
+            return {"code": 20000000, "data": {"task_id": row["task_id"]}, "reattached": True}
+        return _submit_and_record(text, key, session, source)
+
+
+def _submit_and_record(
+    text: str, key: str, session: requests.Session | None, source: str | None
+) -> dict:
+    resp = submit_task(text, session)
+    if resp.get("code") == 20000000:
+        tts_journal.record_submit(
+            resp["data"]["task_id"], key, len(text), source, AUDIO_PARAMS["format"]
+        )
+    return resp
+
+
+def collect_paths(patterns: list[str]) -> list[str]:
+    """Expand files, directories (recursively, *.md) and globs; keep first-seen order."""
+    seen: dict[str, None] = {}
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = sorted(glob.glob(os.path.join(pattern, "**", "*.md"), recursive=True))
+        elif os.path.exists(pattern):
+            matches = [pattern]
+        else:
+            matches = sorted(glob.glob(pattern, recursive=True))
+            if not matches:
+                print(f"No files match: {pattern}", file=sys.stderr)
+        for path in matches:
+            if os.path.isfile(path):
+                seen.setdefault(path, None)
+    return list(seen)
+
+
+def submit_file(path: str, session: requests.Session, use_cache: bool = True) -> dict:
+    """Clean and submit one file; return an NDJSON-ready record instead of raising."""
+    span = tts_metrics.Span("tts_submit", file=os.path.abspath(path))
+    try:
+        with span.phase("clean"):
+            text = md_file_to_plain(path)
+        if use_cache and (task_id := cached_task_id(text)):
+            span.finish("cached", task_id=task_id, chars=len(text))
+            return {
+                "file": path,
+                "task_id": task_id,
+                "chars": len(text),
+                "format": AUDIO_PARAMS["format"],
+                "cached": True,
+            }
+        with span.phase("submit"):
+            resp = submit_or_reattach(text, session, os.path.abspath(path), use_cache)
+    except (OSError, UnicodeDecodeError, requests.RequestException) as exc:
+        span.finish("failed", error=str(exc))
+        return {"file": path, "error": str(exc)}
+    code = resp.get("code")
+    if code != 20000000:
+        span.finish("failed", chars=len(text), error=f"code {code}")
+        return {"file": path, "error": f"submit failed with code {code}", "submit_response": resp}
+    record = {
+        "file": path,
+        "task_id": resp["data"]["task_id"],
+        "chars": len(text),
+        "format": AUDIO_PARAMS["format"],
+    }
+    if resp.get("reattached"):
+        record["reattached"] = True
+    span.finish(
+        "reattached" if resp.get("reattached") else "submitted",
+        task_id=record["task_id"],
+        chars=len(text),
+    )
+    return record
+
+
+def run_batch(paths: list[str], jobs: int, use_cache: bool = True) -> int:
+    """Submit `paths` over a bounded pool sharing one session; one NDJSON line per file."""
+    failed = 0
+    with make_session(jobs) as session, ThreadPoolExecutor(max_workers=jobs) as pool:
+        futures = [pool.submit(submit_file, path, session, use_cache) for path in paths]
+        for future in as_completed(futures):
+            record = future.result()
+            if "error" in record:
+                failed += 1
+            print(json.dumps(record, ensure_ascii=False), flush=True)
+    print(f"Submitted {len(paths) - failed}/{len(paths)} files", file=sys.stderr)
+    return 1 if failed else 0
+
+
 def main() -> int:
     parser = argparse.ArgumentParser(description="Submit a long-text TTS task to Volcengine.")
-    parser.add_argument("file", help="Path to the Markdown file to synthesize.")
+    parser.add_argument(
+        "files",
+        nargs="+",
+        help="Markdown file(s) to synthesize; directories and globs are expanded to *.md.",
+    )
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=8, help="Concurrent submits in batch mode (default: 8)."
+    )
+    parser.add_argument(
+        "--batch", action="store_true", help="Force NDJSON batch output even for a single file."
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Always submit, bypassing the local audio cache and in-flight tasks in the journal.",
+    )
+    add_audio_arguments(parser)
     args = parser.parse_args()
+    use_cache = not args.no_cache
+    apply_audio_arguments(args)
 
-    md_path = args.file
-    with open(md_path, "r", encoding="utf-8") as f:
-        raw = f.read()
+    paths = collect_paths(args.files)
+    if not paths:
+        print("No Markdown files to submit.", file=sys.stderr)
+        return 1
+    if args.batch or len(args.files) > 1 or not os.path.isfile(args.files[0]):
+        return run_batch(paths, max(1, args.jobs), use_cache)
 
-    text = md_to_plain(raw)
+    span = tts_metrics.Span("tts_submit", file=os.path.abspath(paths[0]))
+    with span.phase("clean"):
+        text = md_file_to_plain(paths[0])
     print(f"Cleaned text length: {len(text)} characters", file=sys.stderr)
+    if use_cache and (task_id := cached_task_id(text)):
+        print("Cache hit; nothing to submit.", file=sys.stderr)
+        span.finish("cached", task_id=task_id, chars=len(text))
+        output = {"task_id": task_id, "format": AUDIO_PARAMS["format"], "cached": True}
+        print(json.dumps(output, ensure_ascii=False, indent=2))
+        return 0
     print("Submitting task...", file=sys.stderr)
-    submit_resp = submit_task(text)
+    try:
+        with span.phase("submit"):
+            submit_resp = submit_or_reattach(
+                text, source=os.path.abspath(paths[0]), reattach=use_cache
+            )
+    except (requests.RequestException, OSError) as exc:
+        span.finish("failed", chars=len(text), error=str(exc))
+        print(
+            f"Submit failed: {exc}; re-run later (tasks already submitted finish "
+            "with tts_query.py --resume)",
+            file=sys.stderr,
+        )
+        return 1
 
     code = submit_resp.get("code")
     if code != 20000000:
+        span.finish("failed", chars=len(text), error=f"code {code}")
         print(f"Submit failed with code {code}", file=sys.stderr)
         print(json.dumps(submit_resp, ensure_ascii=False, indent=2))
         return 1
 
     task_id = submit_resp["data"]["task_id"]
+    if submit_resp.get("reattached"):
+        print("Reattached to the in-flight task for this text.", file=sys.stderr)
+    span.finish(
+        "reattached" if submit_resp.get("reattached") else "submitted",
+        task_id=task_id,
+        chars=len(text),
+    )
     output = {
         "task_id": task_id,
+        "chars": len(text),
+        "format": AUDIO_PARAMS["format"],
         "submit_response": submit_resp,
     }
     print(json.dumps(output, ensure_ascii=False, indent=2))
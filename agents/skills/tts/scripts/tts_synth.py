@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+"""Synthesize a long Markdown document as parallel chunks stitched into one audio file."""
+
+import argparse
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+import requests
+
+import tts_cache
+import tts_journal
+import tts_metrics
+from tts_common import AUDIO_FORMATS, make_session
+from tts_query import TaskFailed, await_audio
+from tts_submit import (
+    AUDIO_PARAMS,
+    add_audio_arguments,
+    apply_audio_arguments,
+    md_file_to_plain,
+    submit_or_reattach,
+    text_cache_key,
+)
+
+DEFAULT_CHUNK_CHARS = 4000
+MANIFEST_VERSION = 1
+
+# Split after sentence-final punctuation (CJK and ASCII), keeping it on the left side.
+SENTENCE_END = re.compile(r"(?<=[。！？；!?;…])|(?<=\.)\s+")
+
+# MPEG audio frame header lookup tables, indexed by the version/layer bits.
+_BITRATES = {
+    (3, 3): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (3, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (3, 1): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (2, 3): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (2, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+_BITRATES[(2, 1)] = _BITRATES[(2, 2)]
+_SAMPLE_RATES = {3: [44100, 48000, 32000], 2: [22050, 24000, 16000], 0: [11025, 12000, 8000]}
+
+
+def split_text(text: str, budget: int = DEFAULT_CHUNK_CHARS) -> list[str]:
+    """Pack paragraphs (then sentences, then hard cuts) into chunks of at most `budget` chars."""
+    # (separator before the piece, piece): paragraphs restart with a blank line,
+    # sentences split out of an oversized paragraph continue it with a space.
+    pieces: list[tuple[str, str]] = []
+    for para in re.split(r"\n\s*\n", text):
+        para = para.strip()
+        if not para:
+            continue
+        if len(para) <= budget:
+            pieces.append(("\n\n", para))
+            continue
+        sep = "\n\n"
+        for sentence in SENTENCE_END.split(para):
+            sentence = sentence.strip()
+            while len(sentence) > budget:
+                pieces.append((sep, sentence[:budget]))
+                sentence = sentence[budget:]
+                sep = ""
+            if sentence:
+                pieces.append((sep, sentence))
+                sep = " "
+
+    chunks: list[str] = []
+    current = ""
+    for sep, piece in pieces:
+        joined = f"{current}{sep}{piece}" if current else piece
+        if len(joined) <= budget:
+            current = joined
+        else:
+            chunks.append(current)
+            current = piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _frame_length(header: bytes) -> int:
+    """Byte length of the MPEG audio frame starting with `header`, or 0 if it is not one."""
+    if len(header) < 4 or header[0] != 0xFF or header[1] & 0xE0 != 0xE0:
+        return 0
+    version = (header[1] >> 3) & 0x03
+    layer = (header[1] >> 1) & 0x03
+    bitrate_idx = header[2] >> 4
+    rate_idx = (header[2] >> 2) & 0x03
+    padding = (header[2] >> 1) & 0x01
+    if version == 1 or layer == 0 or bitrate_idx in (0, 15) or rate_idx == 3:
+        return 0
+    bitrate = _BITRATES[(3 if version == 3 else 2, layer)][bitrate_idx] * 1000
+    sample_rate = _SAMPLE_RATES[version][rate_idx]
+    if layer == 3:
+        return (12 * bitrate // sample_rate + padding) * 4
+    if layer == 1 and version != 3:
+        return 72 * bitrate // sample_rate + padding
+    return 144 * bitrate // sample_rate + padding
+
+
+def _is_info_frame(frame: bytes) -> bool:
+    """Xing/Info/VBRI frames carry whole-file metadata that is wrong once files are joined."""
+    return any(tag in frame[:64] for tag in (b"Xing", b"Info", b"VBRI"))
+
+
+def iter_mp3_frames(data: bytes):
+    """Yield the audio frames of an MP3 file, skipping ID3 tags and Xing/Info headers."""
+    pos = 0
+    if data[:3] == b"ID3" and len(data) >= 10:
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        pos = 10 + size + (10 if data[5] & 0x10 else 0)
+    end = len(data)
+    if end - pos >= 128 and data[end - 128:end - 125] == b"TAG":
+        end -= 128
+    first = True
+    while pos + 4 <= end:
+        length = _frame_length(data[pos:pos + 4])
+        if length == 0 or pos + length > end:
+            # Lost sync (junk or a truncated tail): resync on the next 0xFF byte.
+            nxt = data.find(b"\xff", pos + 1, end)
+            if nxt < 0:
+                break
+            pos = nxt
+            continue
+        frame = data[pos:pos + length]
+        if not (first and _is_info_frame(frame)):
+            yield frame
+        first = False
+        pos += length
+
+
+def _copy_part(part: str, out, fmt: str = "mp3") -> None:
+    """Append one chunk: MP3 frame by frame; Ogg Opus whole (a chained stream) and raw PCM as is."""
+    with open(part, "rb") as f:
+        if fmt != "mp3":
+            shutil.copyfileobj(f, out)
+            return
+        for frame in iter_mp3_frames(f.read()):
+            out.write(frame)
+
+
+def concat_audio(parts: list[str], output_path: str, fmt: str = "mp3") -> None:
+    """Join chunk files of format `fmt` into `output_path` without re-encoding."""
+    parent = os.path.dirname(output_path)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+    tmp_path = f"{output_path}.part"
+    with open(tmp_path, "wb") as out:
+        for part in parts:
+            _copy_part(part, out, fmt)
+    os.replace(tmp_path, output_path)
+
+
+def paragraph_segments(text: str, budget: int = DEFAULT_CHUNK_CHARS) -> list[str]:
+    """One segment per paragraph (oversized ones split), so an edit only dirties its paragraph."""
+    segments: list[str] = []
+    for para in re.split(r"\n\s*\n", text):
+        segments.extend(split_text(para, budget))
+    return segments
+
+
+def manifest_path(output_path: str) -> str:
+    return f"{output_path}.tts.json"
+
+
+def load_manifest(output_path: str) -> dict[str, tuple[int, int]]:
+    """Map segment key -> (offset, length) in the existing output, or {} if it is stale."""
+    try:
+        with open(manifest_path(output_path), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        st = os.stat(output_path)
+    except (OSError, ValueError):
+        return {}
+    if (
+        not isinstance(manifest, dict)
+        or manifest.get("version") != MANIFEST_VERSION
+        or manifest.get("size") != st.st_size
+        or manifest.get("mtime_ns") != st.st_mtime_ns
+    ):
+        return {}
+    return {seg["key"]: (seg["offset"], seg["length"]) for seg in manifest.get("segments", [])}
+
+
+def splice_audio(
+    keys: list[str],
+    parts: dict[int, str],
+    previous: dict[str, tuple[int, int]],
+    output_path: str,
+    fmt: str = "mp3",
+) -> None:
+    """Rebuild `output_path` from fresh `parts` and unchanged byte ranges of the old file,
+    then record every segment's range in the manifest."""
+    parent = os.path.dirname(output_path)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+    tmp_path = f"{output_path}.part"
+    segments = []
+    reuse = open(output_path, "rb") if previous else nullcontext()
+    with reuse as old, open(tmp_path, "wb") as out:
+        for i, key in enumerate(keys):
+            offset = out.tell()
+            if i in parts:
+                _copy_part(parts[i], out, fmt)
+            else:
+                old_offset, length = previous[key]
+                old.seek(old_offset)
+                out.write(old.read(length))
+            segments.append({"key": key, "offset": offset, "length": out.tell() - offset})
+    os.replace(tmp_path, output_path)
+
+    st = os.stat(output_path)
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+        "segments": segments,
+    }
+    tmp_manifest = f"{manifest_path(output_path)}.part"
+    with open(tmp_manifest, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_manifest, manifest_path(output_path))
+
+
+def _log(message: str) -> None:
+    # One write per line so messages from worker threads do not interleave.
+    sys.stderr.write(f"{message}\n")
+
+
+def synth_chunk(
+    index: int,
+    text: str,
+    workdir: str,
+    session: requests.Session,
+    retries: int,
+    use_cache: bool = True,
+    spans: list[tts_metrics.Span] | None = None,
+) -> str:
+    """Submit, poll and download one chunk; resubmit only this chunk on failure.
+
+    The chunk's timing span is appended to `spans` when given.
+    """
+    span = tts_metrics.Span("tts_synth")
+    if spans is not None:
+        spans.append(span)
+    path = os.path.join(workdir, f"{index:04d}{AUDIO_FORMATS[AUDIO_PARAMS['format']]}")
+    key = text_cache_key(text)
+    if use_cache and tts_cache.fetch(key, path):
+        _log(f"  chunk {index}: cached ({len(text)} chars)")
+        return path
+    for attempt in range(retries + 1):
+        task_id = None
+        try:
+            # A chunk left in flight by a crashed run is reattached, not paid for again.
+            with span.phase("submit"):
+                resp = submit_or_reattach(text, session, reattach=use_cache)
+            if resp.get("code") != 20000000:
+                raise TaskFailed(f"submit failed with code {resp.get('code')}", resp)
+            task_id = resp["data"]["task_id"]
+            verb = "reattached to" if resp.get("reattached") else "submitted as"
+            _log(f"  chunk {index}: {verb} task {task_id} ({len(text)} chars)")
+            # Journals the chunk as done and caches it under `key` (its journaled hash).
+            await_audio(task_id, path, session, chars=len(text), use_cache=use_cache, span=span)
+            return path
+        except (TaskFailed, requests.RequestException) as exc:
+            if task_id and isinstance(exc, TaskFailed):
+                tts_journal.mark_failed(task_id, str(exc))
+            if attempt == retries:
+                raise
+            _log(f"  chunk {index}: {exc}; retrying")
+    raise AssertionError("unreachable")
+
+
+def report_timings(doc: tts_metrics.Span, spans: list[tts_metrics.Span]) -> None:
+    """Print per-stage seconds; chunk stages show the slowest chunk (the critical path)."""
+    for stage in ("submit", "wait", "download"):
+        doc.phases[stage] = max((span.phases.get(stage, 0.0) for span in spans), default=0.0)
+    doc.polls = sum(span.polls for span in spans)
+    doc.bytes = sum(span.bytes for span in spans)
+    print(
+        json.dumps({"timings": {stage: round(sec, 3) for stage, sec in doc.phases.items()}}),
+        file=sys.stderr,
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Markdown to audio in one process: clean, submit (in parallel chunks for long "
+        "texts), poll, download and join."
+    )
+    parser.add_argument("file", help="Path to the Markdown file to synthesize.")
+    parser.add_argument("output", help="Local file path to save the audio.")
+    parser.add_argument(
+        "--chunk-chars",
+        type=int,
+        default=DEFAULT_CHUNK_CHARS,
+        help=f"Maximum characters per chunk (default: {DEFAULT_CHUNK_CHARS}).",
+    )
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=4, help="Chunks in flight at once (default: 4)."
+    )
+    parser.add_argument(
+        "--retries", type=int, default=1, help="Resubmits per failed chunk (default: 1)."
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true", help="Bypass the local per-chunk audio cache."
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Synthesize per paragraph and only re-submit paragraphs changed since the last run "
+        "(tracked in <output>.tts.json).",
+    )
+    add_audio_arguments(parser)
+    args = parser.parse_args()
+    apply_audio_arguments(args)
+
+    started = time.perf_counter()
+    doc = tts_metrics.Span("tts_synth", file=os.path.abspath(args.file))
+    spans: list[tts_metrics.Span] = []
+    with doc.phase("clean"):
+        text = md_file_to_plain(args.file)
+    budget = max(1, args.chunk_chars)
+    chunks = paragraph_segments(text, budget) if args.incremental else split_text(text, budget)
+    if not chunks:
+        print("Nothing to synthesize after cleaning.", file=sys.stderr)
+        return 1
+    print(f"Cleaned text length: {len(text)} characters in {len(chunks)} chunks", file=sys.stderr)
+
+    keys = [text_cache_key(chunk) for chunk in chunks]
+    previous = load_manifest(args.output) if args.incremental else {}
+    todo = [i for i, key in enumerate(keys) if key not in previous]
+    if args.incremental:
+        print(f"Reusing {len(chunks) - len(todo)}/{len(chunks)} unchanged segments", file=sys.stderr)
+
+    jobs = max(1, args.jobs)
+    with tempfile.TemporaryDirectory(prefix="tts-chunks.") as workdir:
+        with make_session(jobs) as session, ThreadPoolExecutor(max_workers=jobs) as pool:
+            futures = {
+                i: pool.submit(
+                    synth_chunk,
+                    i,
+                    chunks[i],
+                    workdir,
+                    session,
+                    args.retries,
+                    not args.no_cache,
+                    spans,
+                )
+                for i in todo
+            }
+            try:
+                parts = {i: future.result() for i, future in futures.items()}
+            except (TaskFailed, requests.RequestException, OSError) as exc:
+                for future in futures.values():
+                    future.cancel()
+                doc.finish("failed", chars=len(text), error=str(exc))
+                if isinstance(exc, TaskFailed):
+                    print(exc, file=sys.stderr)
+                else:
+                    print(
+                        f"{exc}; finish the submitted segments with tts_query.py --resume, "
+                        "then re-run to stitch them from the cache",
+                        file=sys.stderr,
+                    )
+                if isinstance(exc, TaskFailed) and exc.result is not None:
+                    print(json.dumps(exc.result, ensure_ascii=False, indent=2), file=sys.stderr)
+                return 1
+        stitch_started = time.perf_counter()
+        if args.incremental:
+            splice_audio(keys, parts, previous, args.output, AUDIO_PARAMS["format"])
+        elif len(chunks) == 1:
+            # Nothing to join: keep the file exactly as served.
+            parent = os.path.dirname(args.output)
+            if parent:
+                os.makedirs(parent, exist_ok=True)
+            shutil.move(parts[0], args.output)
+        else:
+            ordered = [parts[i] for i in range(len(chunks))]
+            concat_audio(ordered, args.output, AUDIO_PARAMS["format"])
+        doc.add("stitch", time.perf_counter() - stitch_started)
+    doc.add("total", time.perf_counter() - started)
+    report_timings(doc, spans)
+    doc.finish("done", chars=len(text), chunks=len(chunks))
+    print(args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""CPU cost of the cava.py --subproc renderer per frame.
+
+Feeds synthetic cava frames (a random walk per bar, with stretches of silence)
+to `cava.py --subproc` at each frame rate and bar count, paced like cava
+would, and reports the renderer's CPU time per frame and its share of one
+core. Frame rate 0 feeds frames as fast as the renderer takes them, which
+leaves out the per-frame wakeup and shows the rendering cost itself.
+`--legacy` runs the previous int()-and-concatenate loop alongside:
+
+    bench_cava.py [--seconds 5] [--fps 0,60,144,240] [--bars 8,32,64] [--legacy]
+"""
+
+import argparse
+import os
+import random
+import subprocess
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+CAVA = os.path.join(BENCH_DIR, '..', 'scripts', 'cava.py')
+COLORS = 'fdd,fcc,fbb,faa'
+
+# The renderer as it was before the lookup table, for comparison.
+LEGACY = '''
+import sys
+ramp_list = [' ', '▁', '▂', '▃', '▄', '▅', '▆', '▇', '█']
+ramp_list.extend(
+    f'%{{F#{color.strip(" #")}}}█%{{F-}}'
+    for color in sys.argv[1].split(',')
+    if color
+)
+while True:
+    try:
+        cava_input = input().strip().split()
+    except EOFError:
+        break
+    cava_input = [int(i) for i in cava_input]
+    output = ''
+    for bar in cava_input:
+        if bar < len(ramp_list):
+            output += ramp_list[bar]
+        else:
+            output += ramp_list[-1]
+    print(output)
+'''
+
+
+def frames(bars: int, count: int, silence: float, seed: int) -> list[bytes]:
+    """`count` frames of `bars` values in 0..ascii_max_range, as cava's ascii output."""
+    top = 12 + len(COLORS.split(','))
+    rng = random.Random(seed)
+    levels = [0] * bars
+    out = []
+    quiet = 0
+    for _ in range(count):
+        if quiet == 0 and rng.random() < silence / 30:
+            quiet = 30  # half a second of silence at 60 fps
+        if quiet:
+            quiet -= 1
+            levels = [0] * bars
+        else:
+            levels = [max(0, min(top, level + rng.randint(-3, 3))) for level in levels]
+        out.append((' '.join(map(str, levels)) + ' \n').encode())
+    return out
+
+
+def cpu_seconds(argv: list[str], feed: list[bytes], fps: float) -> float:
+    """User plus system CPU of one renderer process fed `feed` at `fps` frames per second."""
+    proc = subprocess.Popen(argv, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL)
+    period = 1 / fps if fps else 0
+    start = time.perf_counter()
+    for i, frame in enumerate(feed):
+        if period:
+            delay = start + i * period - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        proc.stdin.write(frame)
+        proc.stdin.flush()
+    proc.stdin.close()
+    _, _, usage = os.wait4(proc.pid, 0)
+    return usage.ru_utime + usage.ru_stime
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        '--seconds', type=float, default=5.0, help='Playback per case (default: 5).'
+    )
+    parser.add_argument(
+        '--fps', default='0,60,144,240', help='Frame rates, 0 for unpaced (default: 0,60,144,240).'
+    )
+    parser.add_argument(
+        '--unpaced-frames', type=int, default=50000, help='Frames fed at frame rate 0.'
+    )
+    parser.add_argument('--bars', default='8,32,64', help='Bar counts (default: 8,32,64).')
+    parser.add_argument(
+        '--silence', type=float, default=0.2, help='Rough share of silent frames (default: 0.2).'
+    )
+    parser.add_argument('--legacy', action='store_true', help='Also run the old renderer.')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    renderers = {'table': [sys.executable, CAVA, '--subproc', COLORS]}
+    if args.legacy:
+        renderers['legacy'] = [sys.executable, '-c', LEGACY, COLORS]
+    # Interpreter start-up and exit, taken off every run so only frames are counted.
+    startup = {name: cpu_seconds(argv, [], 0) for name, argv in renderers.items()}
+
+    print(f"{'renderer':<8}  {'fps':>4}  {'bars':>4}  {'us/frame':>9}  {'% core':>7}")
+    for fps in (float(value) for value in args.fps.split(',')):
+        for bars in (int(value) for value in args.bars.split(',')):
+            count = int(fps * args.seconds) if fps else args.unpaced_frames
+            feed = frames(bars, count, args.silence, args.seed)
+            for name, argv in renderers.items():
+                cpu = max(0.0, cpu_seconds(argv, feed, fps) - startup[name])
+                per_frame = cpu / len(feed)
+                share = f'{per_frame * fps * 100:>6.2f}%' if fps else f"{'-':>7}"
+                print(f'{name:<8}  {fps:>4.0f}  {bars:>4}  {per_frame * 1e6:>9.1f}  {share}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
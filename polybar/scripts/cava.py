@@ -7,24 +7,31 @@ import sys
 import tempfile
 
 if len(sys.argv) > 1 and sys.argv[1] == '--subproc':
+    colors = [color for color in sys.argv[2].split(',') if color]
     ramp_list = [' ', '▁', '▂', '▃', '▄', '▅', '▆', '▇', '█']
     ramp_list.extend(
         f'%{{F#{color.strip(" #")}}}█%{{F-}}'
-        for color in sys.argv[2].split(',')
-        if color
+        for color in colors
     )
-    while True:
-        cava_input = input().strip().split()
-        cava_input = [int(i) for i in cava_input]
-        output = ''
-        for bar in cava_input:
-            if bar < len(ramp_list):
-                output += ramp_list[bar]
-
-            else:
-                output += ramp_list[-1]
+    # Glyph for every value cava can send (0..ascii_max_range), keyed by its text,
+    # so a frame is rendered by one C-level map/join with no per-bar Python code.
+    glyphs = {
+        str(value): ramp_list[min(value, len(ramp_list) - 1)]
+        for value in range(12 + len(colors) + 1)
+    }
+    last_frame = None
+    for frame in sys.stdin:
+        # Polybar keeps showing the last line, so a repeated frame (silence) needs no output.
+        if frame == last_frame:
+            continue
+        last_frame = frame
+        try:
+            output = ''.join(map(glyphs.__getitem__, frame.split()))
+        except KeyError:
+            output = ''.join(ramp_list[min(int(bar), len(ramp_list) - 1)] for bar in frame.split())
 
         print(output)
+    sys.exit(0)
 
 parser = argparse.ArgumentParser()
 parser.add_argument('-f', '--framerate', type=int, default=60,